@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__package__)
+
+MAX_RESPONSE_SIZE = 8 * 1024 * 1024
+
+
+class FetchError(Exception):
+    pass
+
+
+class CircuitBreaker(object):
+    """
+    Stops calling an API that keeps failing.
+    After failure_threshold failures in a row the circuit opens and calls are refused for reset_timeout seconds.
+    Then one call is let through (half open), if it fails too the timeout doubles up to max_timeout.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=60, max_timeout=1800):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_timeout = max_timeout
+        self.timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.lock = threading.Lock()
+
+    def current_state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.time() - self.opened_at >= self.timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self.lock:
+            return self.current_state() != 'open'
+
+    def success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info('circuit closed, api is back')
+            self.failures = 0
+            self.opened_at = None
+            self.timeout = self.reset_timeout
+            self.last_error = None
+
+    def failure(self, error):
+        with self.lock:
+            self.failures += 1
+            self.last_error = str(error)
+
+            if self.current_state() == 'half_open':
+                # the probe failed, wait longer before the next one
+                self.timeout = min(self.timeout * 2, self.max_timeout)
+                self.opened_at = time.time()
+                logger.warning(f'circuit open again for {self.timeout}s')
+            elif self.opened_at is None and self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+                logger.warning(f'circuit open for {self.timeout}s after {self.failures} failures')
+
+    def state(self):
+        with self.lock:
+            retry_in = 0
+            if self.opened_at is not None:
+                retry_in = max(0, round(self.opened_at + self.timeout - time.time()))
+            return {'state': self.current_state(), 'failures': self.failures, 'retry_in': retry_in,
+                    'last_error': self.last_error}
+
+
+async def read_body(reader, headers):
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+            if size == 0:
+                await reader.readline()
+                return bytes(body)
+            if len(body) + size > MAX_RESPONSE_SIZE:
+                raise FetchError('response too large')
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+
+    if 'content-length' in headers:
+        length = int(headers['content-length'])
+        if length > MAX_RESPONSE_SIZE:
+            raise FetchError('response too large')
+        return await reader.readexactly(length)
+
+    return await reader.read(MAX_RESPONSE_SIZE)
+
+
+async def get_json(url, connect_timeout, read_timeout):
+    """
+    one GET request, connecting and reading the response each have their own deadline
+    """
+    parts = urlsplit(url)
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    path = parts.path + ('?' + parts.query if parts.query else '')
+
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, port, ssl=ssl.create_default_context() if secure else None),
+            connect_timeout)
+    except asyncio.TimeoutError:
+        raise FetchError(f'connect timeout after {connect_timeout}s')
+
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {parts.hostname}\r\nAccept: application/json\r\n'
+                     f'Connection: close\r\n\r\n'.encode('latin-1'))
+
+        async def read_response():
+            status_line = (await reader.readline()).decode('latin-1')
+            if not status_line:
+                raise FetchError('connection closed without response')
+            status = int(status_line.split(' ', 2)[1])
+
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                key, _, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+
+            return status, await read_body(reader, headers)
+
+        try:
+            status, body = await asyncio.wait_for(read_response(), read_timeout)
+        except asyncio.TimeoutError:
+            raise FetchError(f'read timeout after {read_timeout}s')
+        except asyncio.IncompleteReadError:
+            raise FetchError('response ended early')
+
+        if status != 200:
+            raise FetchError(f'http status {status}')
+
+        try:
+            return json.loads(body)
+        except ValueError as json_ex:
+            raise FetchError(f'malformed json: {json_ex}')
+    finally:
+        writer.close()
+
+
+async def hedged_get_json(url, connect_timeout, read_timeout, hedge_after):
+    """
+    sends a second identical request if the first one takes longer than hedge_after seconds,
+    the first successful response wins and the other request is cancelled
+    """
+    tasks = [asyncio.ensure_future(get_json(url, connect_timeout, read_timeout))]
+    errors = []
+
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done:
+            logger.info(f'no response after {hedge_after}s, sending hedged request')
+            tasks.append(asyncio.ensure_future(get_json(url, connect_timeout, read_timeout)))
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                errors.append(task.exception())
+
+        raise FetchError('; '.join(str(error) for error in errors))
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def fetch_json(url, connect_timeout=5, read_timeout=15, hedge_after=4, validate=None, breaker=None):
+    """
+    blocking entry point for the update timer thread
+
+    :param validate: called with the parsed json, raises ValueError or KeyError if it can not be used
+    :param breaker: CircuitBreaker that is asked before and told after the request
+    :raises FetchError: on any failure, also if the circuit is open
+    """
+    if breaker is not None and not breaker.allow():
+        raise FetchError(f'circuit open: {breaker.state()}')
+
+    try:
+        payload = asyncio.run(hedged_get_json(url, connect_timeout, read_timeout, hedge_after))
+        if validate is not None:
+            validate(payload)
+    except (FetchError, OSError, ValueError, KeyError, TypeError, IndexError) as fetch_ex:
+        if breaker is not None:
+            breaker.failure(fetch_ex)
+        if isinstance(fetch_ex, FetchError):
+            raise
+        raise FetchError(f'{type(fetch_ex).__name__}: {fetch_ex}') from fetch_ex
+
+    if breaker is not None:
+        breaker.success()
+
+    return payload
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import logging
+from urllib.parse import urlsplit, parse_qs
+
+from Webserver import PROFILES, config, schedule, frame_version, read_frame, bands_version, read_bands, read_status
+
+logger = logging.getLogger(__package__)
+
+REQUEST_TIMEOUT = 10
+
+STATUS_TEXT = {200: 'OK', 206: 'Partial Content', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               409: 'Conflict', 416: 'Range Not Satisfiable', 503: 'Service Unavailable'}
+
+
+def parse_range(value, length):
+    """
+    :param value: the Range header, only a single byte range is supported
+    :param length: size of the whole body
+    :return: (first, last) byte, both included, None to send the whole body
+    :raises ValueError: if the range lies outside the body
+    """
+    unit, _, spec = value.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+
+    first, _, last = spec.strip().partition('-')
+    if not (first or last) or not (first or '0').isdigit() or not (last or '0').isdigit():
+        return None
+
+    if not first:
+        # the last n bytes
+        if int(last) == 0:
+            raise ValueError('empty suffix range')
+        return max(0, length - int(last)), length - 1
+
+    if int(first) >= length or (last and int(last) < int(first)):
+        raise ValueError(f'range {value} outside of {length} bytes')
+    return int(first), min(int(last), length - 1) if last else length - 1
+
+
+def split_band_path(path):
+    """
+    :return: (frame path, band) where band is None for the frame, 'index' for the band list or the band number
+    """
+    head, _, tail = path.rpartition('/')
+    if tail == 'bands':
+        return head or '/', 'index'
+    frame_path, _, kind = head.rpartition('/')
+    if kind == 'band' and tail.isdigit():
+        return frame_path or '/', int(tail)
+    return path, None
+
+
+class FrameCache(object):
+    """
+    Keeps the published frame in memory and shares it between all requests.
+    A new frame is read once, requests arriving while it is read wait for the same load.
+    """
+
+    def __init__(self, profile=None, version=frame_version, read=read_frame):
+        """
+        :param version: function(profile) that changes with every published frame
+        :param read: function(profile) returning (data, info)
+        """
+        self.profile = profile
+        self.version_of = version
+        self.read = read
+        self.frame = None
+        self.info = None
+        self.version = None
+        self.timestamp = None
+        self.loading = None
+
+    async def get(self):
+        version = self.version_of(self.profile)
+        if version is None:
+            return self.frame
+
+        if version != self.version:
+            if self.loading is None:
+                self.loading = asyncio.ensure_future(self.load(version))
+            await asyncio.shield(self.loading)
+
+        return self.frame
+
+    async def load(self, version):
+        try:
+            frame, info = await asyncio.to_thread(self.read, self.profile)
+            if frame is None:
+                logger.warning('frame could not be loaded')
+                return
+            self.frame, self.info = frame, info
+            self.version = version
+            self.timestamp = info['timestamp']
+            logger.info(f'frame loaded into memory: {len(self.frame)} bytes')
+        finally:
+            self.loading = None
+
+
+class AsyncServer(object):
+    """
+    Minimal HTTP/1.1 server for the published frame.
+    At most max_clients responses are written at once, further clients queue up to backlog and get a 503 beyond that.
+    """
+
+    def __init__(self, frames, max_clients=32, backlog=256, bands=None):
+        """
+        :param frames: dict of request path -> FrameCache
+        :param bands: dict of the same paths -> FrameCache of the bands of that frame
+        """
+        self.frames = frames
+        self.bands = bands or {}
+        self.slots = asyncio.Semaphore(max_clients)
+        self.backlog = backlog
+        self.waiting = 0
+
+    async def handle(self, reader, writer):
+        try:
+            method, target, headers = await asyncio.wait_for(self.read_request(reader), REQUEST_TIMEOUT)
+            target = urlsplit(target)
+            query = parse_qs(target.query)
+            path, band = split_band_path(target.path)
+
+            # frames can identify themselves with ?device=..., otherwise the address is used
+            device = query.get('device', [None])[0] or writer.get_extra_info('peername')[0]
+
+            if method not in ('GET', 'HEAD'):
+                await self.respond(writer, 405)
+            elif target.path == '/status':
+                frames = self.frames['/']
+                await frames.get()
+                status = schedule.hint(device, frames.timestamp)
+                status['encoding'] = frames.info
+                status['app'] = read_status()
+                status = json.dumps(status).encode('utf-8')
+                await self.respond(writer, 200, status, 'application/json', head=method == 'HEAD')
+            elif path not in self.frames or (band is not None and path not in self.bands):
+                await self.respond(writer, 404)
+            elif band == 'index':
+                bands = self.bands[path]
+                await bands.get()
+                if bands.info is None:
+                    await self.respond(writer, 404)
+                else:
+                    await self.respond(writer, 200, json.dumps(bands.info).encode('utf-8'), 'application/json',
+                                       head=method == 'HEAD')
+            elif self.waiting >= self.backlog:
+                await self.respond(writer, 503, headers={'Retry-After': '5'})
+            else:
+                self.waiting += 1
+                try:
+                    await self.slots.acquire()
+                finally:
+                    self.waiting -= 1
+
+                try:
+                    if band is None:
+                        frames = self.frames[path]
+                        body = await frames.get()
+                        info = frames.info
+                    else:
+                        body, info = await self.band(path, band, query)
+
+                    if body is None:
+                        await self.respond(writer, 404)
+                    elif info is None:
+                        # a newer frame was published since the device read the band index
+                        await self.respond(writer, 409)
+                    else:
+                        await self.respond_range(writer, headers.get('range'), body, info['mimetype'],
+                                                 head=method == 'HEAD',
+                                                 headers=schedule.headers(device, info['timestamp']))
+                finally:
+                    self.slots.release()
+
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError) as request_ex:
+            logger.debug(f'request aborted: {request_ex}')
+        finally:
+            writer.close()
+
+    async def band(self, path, number, query):
+        """
+        :return: (data, index) of one band, (None, None) if it does not exist and (data, None) if ?frame= is outdated
+        """
+        bands = self.bands[path]
+        data = await bands.get()
+        if data is None or number >= len(bands.info['bands']):
+            return None, None
+
+        frame = query.get('frame', [None])[0]
+        if frame is not None and frame != str(bands.info['frame']):
+            return data, None
+
+        band = bands.info['bands'][number]
+        return data[band['offset']:band['offset'] + band['size']], bands.info
+
+    @staticmethod
+    async def read_request(reader):
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        if not request_line:
+            raise ValueError('empty request')
+
+        method, target, _ = request_line.split(' ', 2)
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        return method, target, headers
+
+    async def respond_range(self, writer, range_header, body, content_type, head=False, headers=None):
+        """
+        responds with the whole body or the single byte range the client asked for
+        """
+        headers = dict(headers or {}, **{'Accept-Ranges': 'bytes'})
+
+        try:
+            byte_range = parse_range(range_header, len(body)) if range_header else None
+        except ValueError:
+            headers['Content-Range'] = f'bytes */{len(body)}'
+            await self.respond(writer, 416, headers=headers)
+            return
+
+        if byte_range is None:
+            await self.respond(writer, 200, body, content_type, head=head, headers=headers)
+        else:
+            first, last = byte_range
+            headers['Content-Range'] = f'bytes {first}-{last}/{len(body)}'
+            await self.respond(writer, 206, body[first:last + 1], content_type, head=head, headers=headers)
+
+    @staticmethod
+    async def respond(writer, status, body=b'', content_type='text/plain', head=False, headers=None):
+        lines = [f'HTTP/1.1 {status} {STATUS_TEXT[status]}',
+                 f'Content-Type: {content_type}',
+                 f'Content-Length: {len(body)}',
+                 'Connection: close']
+        for key, value in (headers or {}).items():
+            lines.append(f'{key}: {value}')
+
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if not head:
+            writer.write(body)
+
+        # backpressure: do not queue more data than the client reads, and do not wait on it forever
+        await asyncio.wait_for(writer.drain(), REQUEST_TIMEOUT)
+
+
+async def serve(host, port, max_clients, backlog):
+    frames = {'/': FrameCache()}
+    bands = {'/': FrameCache(version=bands_version, read=read_bands)}
+    for profile in PROFILES:
+        frames['/profile/' + profile] = FrameCache(profile)
+        bands['/profile/' + profile] = FrameCache(profile, bands_version, read_bands)
+
+    server = AsyncServer(frames, max_clients, backlog, bands)
+    tcp_server = await asyncio.start_server(server.handle, host, port, backlog=backlog)
+
+    async with tcp_server:
+        await tcp_server.serve_forever()
+
+
+def run_server():
+    print('Async server initialized')
+    print('Server running on http://localhost:' + str(config['SERVER_Port']))
+    asyncio.run(serve('0.0.0.0', config['SERVER_Port'], config['SERVER_MAX_CLIENTS'], config['SERVER_BACKLOG']))
@@ -0,0 +1,48 @@
+import os
+
+
+def mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def changed_keys(old, new):
+    """
+    :return: set of the top level keys whose values differ between two settings dicts
+    """
+    return {key for key in set(old) | set(new) if old.get(key) != new.get(key)}
+
+
+class ConfigWatcher(object):
+    """
+    Polls the modification time of the settings files, a stat per file is cheap enough for every frame.
+    Works on every filesystem and needs no inotify, editors that replace the file are noticed as well.
+    """
+
+    def __init__(self, paths):
+        self.mtimes = {}
+        self.watch(paths)
+
+    def watch(self, paths):
+        """
+        :param paths: the files to watch from now on, files that were watched before keep their known state
+        """
+        self.mtimes = {path: self.mtimes[path] if path in self.mtimes else mtime(path) for path in paths}
+
+    def forget(self, path):
+        # the file is reported again on the next poll, e.g. after it was read while still being written
+        self.mtimes[path] = None
+
+    def changed(self):
+        """
+        :return: list of the watched files that changed since the last call
+        """
+        changed = []
+        for path, old_mtime in self.mtimes.items():
+            new_mtime = mtime(path)
+            if new_mtime != old_mtime:
+                self.mtimes[path] = new_mtime
+                changed.append(path)
+        return changed
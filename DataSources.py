@@ -0,0 +1,62 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__package__)
+
+
+class DataSource(object):
+    """
+    One kind of data shown on the display, fetched independently of the others.
+    """
+
+    def __init__(self, name, fetch):
+        """
+        :param name: key of the data in the merged snapshot, e.g. 'weather'
+        :param fetch: blocking function fetch(current_datetime) returning a dict, raises on failure
+        """
+        self.name = name
+        self.fetch = fetch
+
+
+def fetch_all(sources, current_datetime, previous=None):
+    """
+    fetches all sources at the same time, so an update takes as long as the slowest source and not their sum
+
+    A failed source keeps its data of the previous snapshot, freshness tells when each source was last fetched.
+
+    :param previous: the snapshot of the last update or None
+    :return: snapshot dict with the data of every source under its name and a 'freshness' entry
+    """
+    previous = previous or {}
+    snapshot = {'freshness': {}}
+    start = time.perf_counter()
+
+    def timed_fetch(source):
+        source_start = time.perf_counter()
+        try:
+            return source.fetch(current_datetime), None, time.perf_counter() - source_start
+        except Exception as source_ex:
+            return None, source_ex, time.perf_counter() - source_start
+
+    with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+        results = list(executor.map(timed_fetch, sources))
+
+    for source, (data, error, duration) in zip(sources, results):
+        old_freshness = previous.get('freshness', {}).get(source.name, {})
+
+        if error is None:
+            snapshot[source.name] = data
+            snapshot['freshness'][source.name] = {'fetched_at': time.time(), 'ok': True, 'error': None,
+                                                  'duration': round(duration, 3)}
+        else:
+            logger.warning(f'{source.name} source failed: {error}')
+            if source.name in previous:
+                snapshot[source.name] = previous[source.name]
+            snapshot['freshness'][source.name] = {'fetched_at': old_freshness.get('fetched_at'), 'ok': False,
+                                                  'error': str(error), 'duration': round(duration, 3)}
+
+    logger.info(f'{len(sources)} sources fetched in {round(time.perf_counter() - start, 3)}s: '
+                f'{ {name: f["duration"] for name, f in snapshot["freshness"].items()} }')
+
+    return snapshot
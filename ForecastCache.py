@@ -0,0 +1,119 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+PATH = sys.path[0] + "/"
+
+logger = logging.getLogger(__package__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS forecast (
+    key TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+'''
+
+# number of byte ranges of the lock file, keys are hashed onto them
+LOCK_SLOTS = 65536
+
+
+def snap(lat, lon, grid):
+    """
+    :return: center of the model grid cell the location falls into, all locations of a cell get the same forecast
+    """
+    return (round((math.floor(float(lat) / grid) + 0.5) * grid, 4),
+            round((math.floor(float(lon) / grid) + 0.5) * grid, 4))
+
+
+class ForecastCache(object):
+    """
+    Forecast responses shared by all processes on this host, keyed by grid cell, timezone and date.
+    Only one process (and one thread) fetches a key at a time, the others wait and read its result.
+    """
+
+    def __init__(self, db_path, ttl=600):
+        """
+        :param db_path: sqlite file, relative paths are resolved against the project folder
+        :param ttl: seconds a fetched forecast is used before it is fetched again
+        """
+        self.db_path = os.path.join(PATH, db_path)
+        self.lock_path = self.db_path + '.lock'
+        self.ttl = ttl
+        self.thread_locks = {}
+        self.thread_locks_lock = threading.Lock()
+
+        with self.connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @contextlib.contextmanager
+    def single_flight(self, key):
+        slot = int.from_bytes(hashlib.sha1(key.encode('utf-8')).digest()[:4], 'big') % LOCK_SLOTS
+
+        # record locks only exclude other processes, threads of this process need their own lock,
+        # one per slot like the byte ranges, so daily keys do not pile up locks
+        with self.thread_locks_lock:
+            thread_lock = self.thread_locks.setdefault(slot, threading.Lock())
+
+        with thread_lock, open(self.lock_path, 'a+b') as lock_file:
+            fcntl.lockf(lock_file, fcntl.LOCK_EX, 1, slot)
+            try:
+                yield
+            finally:
+                fcntl.lockf(lock_file, fcntl.LOCK_UN, 1, slot)
+
+    def read(self, key):
+        """
+        :return: (fetched_at, payload) or None
+        """
+        with self.connect() as db:
+            row = db.execute('SELECT fetched_at, payload FROM forecast WHERE key = ?', (key,)).fetchone()
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    def write(self, key, payload):
+        with self.connect() as db:
+            db.execute('INSERT OR REPLACE INTO forecast (key, fetched_at, payload) VALUES (?, ?, ?)',
+                       (key, time.time(), json.dumps(payload)))
+            # forecasts of past days are never asked for again
+            db.execute('DELETE FROM forecast WHERE fetched_at < ?', (time.time() - 86400,))
+
+    def get(self, key, fetch):
+        """
+        :param fetch: called without arguments when the key is missing or expired, returns the json payload
+        :return: the cached or freshly fetched payload
+        """
+        cached = self.read(key)
+        if cached is not None and time.time() - cached[0] < self.ttl:
+            logger.info(f'forecast cache hit: {key}')
+            return cached[1]
+
+        with self.single_flight(key):
+            # another process may have fetched while this one waited for the lock
+            cached = self.read(key)
+            if cached is not None and time.time() - cached[0] < self.ttl:
+                logger.info(f'forecast cache hit after wait: {key}')
+                return cached[1]
+
+            payload = fetch()
+            self.write(key, payload)
+            logger.info(f'forecast cache filled: {key}')
+
+        return payload
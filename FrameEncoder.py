@@ -0,0 +1,164 @@
+import io
+import logging
+import time
+
+from PIL import ImageChops, ImageStat
+
+logger = logging.getLogger(__package__)
+
+MIMETYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png'}
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png'}
+
+# Pillow subsampling values
+SUBSAMPLING = {0: '4:4:4', 2: '4:2:0'}
+
+# palette sizes tried for png, anti aliased text and icons give a frame thousands of colors
+PALETTE_SIZES = (16, 64, 256)
+
+
+def encode_png(image, colors):
+    return save_png(image.quantize(colors=colors, dither=0))
+
+
+def save_png(palette_image):
+    buffer = io.BytesIO()
+    palette_image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def palette_error(image, palette_image):
+    """
+    :return: mean difference per channel (0-255) between the image and its quantized version
+    """
+    difference = ImageChops.difference(image, palette_image.convert('RGB'))
+    return sum(ImageStat.Stat(difference).mean) / 3
+
+
+def encode_jpeg(image, quality, subsampling):
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality, subsampling=subsampling, optimize=True)
+    return buffer.getvalue()
+
+
+def encode(image, byte_budget, time_budget=2.0, formats=('JPEG',), min_quality=30, max_quality=95, max_error=1.0):
+    """
+    encodes the frame as good as possible within byte_budget, the search stops after time_budget seconds
+
+    Frames that look the same with a small palette (flat e-ink colors) are stored as palette png if that fits,
+    the smallest of PALETTE_SIZES that stays within max_error is used.
+    Otherwise the jpeg quality is binary searched, once with full chroma (sharp colored text) and once subsampled.
+
+    :param image: RGB PIL image
+    :param max_error: mean difference per channel (0-255) a png palette may have, 0 for lossless only
+    :return: (data, info) where info holds the chosen settings and the size of every tried candidate
+    """
+    start = time.perf_counter()
+    candidates = []
+    fitting = None
+    smallest = None
+
+    def remaining():
+        return time_budget - (time.perf_counter() - start)
+
+    def consider(data, settings):
+        nonlocal fitting, smallest
+        candidates.append(dict(settings, size=len(data)))
+        if smallest is None or len(data) < len(smallest[0]):
+            smallest = (data, settings)
+        if len(data) > byte_budget:
+            return False
+        # of the fitting candidates the one with the best quality wins, on a tie the earlier (full chroma) one
+        if fitting is None or settings.get('quality', 100) > fitting[1].get('quality', 100):
+            fitting = (data, settings)
+        return True
+
+    if 'PNG' in formats:
+        colors = image.getcolors(256)
+        # a frame with few colors fits into its own palette without loss
+        palette_sizes = PALETTE_SIZES if colors is None else [len(colors)]
+
+        for size in palette_sizes:
+            palette_image = image.quantize(colors=size, dither=0)
+            error = palette_error(image, palette_image)
+            settings = {'format': 'PNG', 'colors': size, 'error': round(error, 2)}
+            if error > max_error:
+                # too far off, a larger palette may be close enough
+                candidates.append(settings)
+                continue
+            if consider(save_png(palette_image), settings):
+                return finish(fitting, True, candidates, byte_budget, start)
+            # a larger palette would only be larger
+            break
+
+    if 'JPEG' in formats:
+        for subsampling in SUBSAMPLING:
+            low, high = min_quality, max_quality
+            while low <= high and remaining() > 0:
+                quality = (low + high) // 2
+                settings = {'format': 'JPEG', 'quality': quality, 'subsampling': SUBSAMPLING[subsampling]}
+                if consider(encode_jpeg(image, quality, subsampling), settings):
+                    low = quality + 1
+                else:
+                    high = quality - 1
+
+            # full chroma at a good quality is the better choice for text, subsampling only helps below that
+            if fitting is not None and fitting[1]['quality'] >= (min_quality + max_quality) // 2:
+                break
+
+    if smallest is None:
+        # png only but no palette close enough, or no time at all: a plain jpeg is better than no frame
+        consider(encode_jpeg(image, max_quality, 0), {'format': 'JPEG', 'quality': max_quality, 'subsampling': '4:4:4'})
+
+    if fitting is not None:
+        return finish(fitting, True, candidates, byte_budget, start)
+    return finish(smallest, False, candidates, byte_budget, start)
+
+
+def encode_bands(image, band_height, settings):
+    """
+    cuts the frame into horizontal bands that are each a complete image, in the format and quality chosen for the
+    whole frame, so a device can fetch, decode and show one band at a time with a small buffer
+
+    :param band_height: rows per band, a multiple of 16 keeps subsampled jpeg bands free of edge artifacts
+    :param settings: the info returned by encode() for the whole frame
+    :return: list of (data, info) from top to bottom
+    """
+    subsampling = {name: value for value, name in SUBSAMPLING.items()}
+    bands = []
+
+    for top in range(0, image.height, band_height):
+        start = time.perf_counter()
+        band = image.crop((0, top, image.width, min(top + band_height, image.height)))
+
+        if settings['format'] == 'PNG':
+            data = encode_png(band, settings['colors'])
+        else:
+            data = encode_jpeg(band, settings['quality'], subsampling[settings['subsampling']])
+
+        bands.append((data, {'top': top, 'height': band.height, 'size': len(data),
+                             'mimetype': MIMETYPES[settings['format']],
+                             'encode_time': round(time.perf_counter() - start, 4)}))
+
+    logger.info(f'{len(bands)} bands encoded: largest {max(info["size"] for _, info in bands)} bytes, '
+                f'{sum(info["size"] for _, info in bands)} bytes in total')
+
+    return bands
+
+
+def finish(best, fits, candidates, byte_budget, start):
+    data, settings = best
+    info = dict(settings,
+                size=len(data),
+                byte_budget=byte_budget,
+                within_budget=fits,
+                mimetype=MIMETYPES[settings['format']],
+                extension=EXTENSIONS[settings['format']],
+                encode_time=round(time.perf_counter() - start, 3),
+                candidates=candidates)
+
+    if not fits:
+        logger.warning(f'frame exceeds byte budget: {len(data)} > {byte_budget} bytes')
+    logger.info(f'frame encoded: {settings} {len(data)} bytes in {info["encode_time"]}s '
+                f'({len(candidates)} candidates)')
+
+    return data, info
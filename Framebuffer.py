@@ -0,0 +1,114 @@
+import logging
+import mmap
+import os
+import stat
+import time
+
+import pygame
+
+logger = logging.getLogger(__package__)
+
+# color masks of the pixel formats linux framebuffers use, by bits per pixel
+PIXEL_FORMATS = {
+    16: (0xF800, 0x07E0, 0x001F, 0),  # RGB565
+    32: (0xFF0000, 0x00FF00, 0x0000FF, 0),  # XRGB8888
+}
+
+
+def read_geometry(device):
+    """
+    :param device: path of the framebuffer device, e.g. /dev/fb1
+    :return: (width, height, bits_per_pixel, stride) from sysfs or None if the device has no sysfs entry
+    """
+    sysfs = os.path.join('/sys/class/graphics', os.path.basename(device))
+
+    try:
+        with open(os.path.join(sysfs, 'virtual_size')) as size_file:
+            width, height = (int(value) for value in size_file.read().strip().split(','))
+        with open(os.path.join(sysfs, 'bits_per_pixel')) as bpp_file:
+            bits_per_pixel = int(bpp_file.read())
+        with open(os.path.join(sysfs, 'stride')) as stride_file:
+            stride = int(stride_file.read())
+    except (OSError, ValueError):
+        return None
+
+    return width, height, bits_per_pixel, stride
+
+
+class Framebuffer(object):
+    """
+    Writes frames into a memory mapped framebuffer device without SDL.
+    Only rows that changed since the last frame are copied, with a clock once a second that is a small strip.
+    Any regular file works as device too, it is grown to the frame size.
+    """
+
+    def __init__(self, device, width, height, bits_per_pixel=16):
+        """
+        :param width: used with height and bits_per_pixel if the device has no sysfs geometry, like a regular file
+        """
+        geometry = read_geometry(device)
+        if geometry is None:
+            geometry = width, height, bits_per_pixel, width * bits_per_pixel // 8
+
+        self.width, self.height, self.bits_per_pixel, self.stride = geometry
+
+        if self.bits_per_pixel not in PIXEL_FORMATS:
+            raise ValueError(f'{device}: {self.bits_per_pixel} bits per pixel are not supported')
+
+        self.device = device
+        self.length = self.stride * self.height
+        self.row_bytes = self.width * self.bits_per_pixel // 8
+
+        self.fd = os.open(device, os.O_RDWR)
+        if stat.S_ISREG(os.fstat(self.fd).st_mode) and os.fstat(self.fd).st_size < self.length:
+            os.ftruncate(self.fd, self.length)
+
+        self.map = mmap.mmap(self.fd, self.length, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+
+        # the frame in the pixel format of the device, SDL converts into it when a frame is blitted
+        self.surface = pygame.Surface((self.width, self.height), 0, self.bits_per_pixel,
+                                      PIXEL_FORMATS[self.bits_per_pixel])
+        self.previous = None
+
+        logger.info(f'framebuffer {device}: {self.width}x{self.height} {self.bits_per_pixel} bpp, '
+                    f'stride {self.stride}')
+
+    def write(self, data, pitch):
+        """
+        copies the rows of a frame that differ from the last one into the framebuffer
+
+        :param data: frame in the pixel format of the device
+        :param pitch: bytes from one row of data to the next
+        :return: number of changed rows
+        """
+        changed = 0
+
+        for y in range(min(self.height, len(data) // pitch)):
+            start = y * pitch
+            row = data[start:start + self.row_bytes]
+
+            if self.previous is not None and self.previous[start:start + self.row_bytes] == row:
+                continue
+
+            offset = y * self.stride
+            self.map[offset:offset + len(row)] = row
+            changed += 1
+
+        self.previous = data
+        return changed
+
+    def show(self, surf, pos=(0, 0)):
+        """
+        converts a surface to the pixel format of the device and writes the changed rows
+        """
+        start = time.perf_counter()
+
+        self.surface.blit(surf, pos)
+        changed = self.write(self.surface.get_buffer().raw, self.surface.get_pitch())
+
+        logger.debug(f'framebuffer: {changed} rows written in {round((time.perf_counter() - start) * 1000, 1)}ms')
+        return changed
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Packs all icons into one atlas image and an index, so startup reads and decodes a single file.
+The cells have to be as large as the largest drawn icon, profiles zoomed above 2 get larger cells.
+
+    python3 IconAtlas.py [--size 256]
+"""
+
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import sys
+
+from PIL import Image
+
+PATH = sys.path[0] + "/"
+ICON_PATH = os.path.join(PATH, 'icons')
+ATLAS_PATH = os.path.join(PATH, 'atlas')
+
+ATLAS_IMAGE = 'icons.png'
+ATLAS_INDEX = 'icons.json'
+
+# icons are drawn at 120px at most at zoom 1, larger cells only cost memory
+CELL_SIZE = 256
+
+logger = logging.getLogger(__package__)
+
+
+def split_variant(image_id):
+    """
+    :return: (base, 'd' or 'n') for weather icons like c01d, (image_id, None) for all others
+    """
+    if len(image_id) == 4 and image_id[-1] in 'dn' and image_id[1:3].isdigit():
+        return image_id[:-1], image_id[-1]
+    return image_id, None
+
+
+def build_atlas(icon_path=ICON_PATH, atlas_path=ATLAS_PATH, cell_size=CELL_SIZE):
+    icons = sorted(img for img in os.listdir(icon_path) if img.endswith('.png') and img.split('.')[0] != '')
+
+    columns = math.ceil(math.sqrt(len(icons)))
+    rows = math.ceil(len(icons) / columns)
+    atlas = Image.new('RGBA', (columns * cell_size, rows * cell_size))
+    index = {'cell_size': cell_size, 'icons': {}}
+
+    for i, img in enumerate(icons):
+        image_id = img.split('.')[0]
+        with Image.open(os.path.join(icon_path, img)) as icon:
+            icon = icon.convert('RGBA')
+            icon.thumbnail((cell_size, cell_size), Image.LANCZOS)
+
+        x, y = (i % columns) * cell_size, (i // columns) * cell_size
+        atlas.paste(icon, (x, y))
+
+        base, variant = split_variant(image_id)
+        index['icons'][image_id] = {'rect': [x, y, icon.size[0], icon.size[1]], 'base': base, 'variant': variant}
+
+    os.makedirs(atlas_path, exist_ok=True)
+    atlas.save(os.path.join(atlas_path, ATLAS_IMAGE), optimize=True)
+    with open(os.path.join(atlas_path, ATLAS_INDEX), 'w') as outputfile:
+        json.dump(index, outputfile, indent=2, sort_keys=True)
+
+    logger.info(f'icon atlas built: {len(icons)} icons, {atlas.size[0]}x{atlas.size[1]}px')
+
+
+class IconAtlas(object):
+    """
+    Dict-like access to the icons of the atlas.
+    The atlas is read and decoded once, single icons are only cut out when they are first used.
+    """
+
+    def __init__(self, atlas_path=ATLAS_PATH):
+        with open(os.path.join(atlas_path, ATLAS_INDEX)) as index_file:
+            self.index = json.load(index_file)['icons']
+
+        with open(os.path.join(atlas_path, ATLAS_IMAGE), 'rb') as atlas_file:
+            self.atlas = Image.open(io.BytesIO(atlas_file.read()))
+            self.atlas.load()
+
+        self.icons = {}
+
+    def __contains__(self, image_id):
+        return image_id in self.index
+
+    def __getitem__(self, image_id):
+        icon = self.icons.get(image_id)
+        if icon is None:
+            x, y, w, h = self.index[image_id]['rect']
+            icon = self.atlas.crop((x, y, x + w, y + h))
+            self.icons[image_id] = icon
+        return icon
+
+    def keys(self):
+        return self.index.keys()
+
+    def variant(self, base, day_or_night):
+        """
+        :return: the id of the day or night variant of a weather icon or None if the atlas does not have it
+        """
+        image_id = base + day_or_night
+        return image_id if image_id in self.index else None
+
+    def prepare(self, image_ids):
+        """
+        cuts out the given icons ahead of rendering, unknown ids are ignored
+        """
+        for image_id in image_ids:
+            if image_id in self.index:
+                self[image_id]
+
+
+def newest_icon(icon_path=ICON_PATH):
+    """
+    :return: the newest mtime of the folder and its icons, the folder alone does not change when an icon is edited
+    """
+    mtimes = [os.path.getmtime(os.path.join(icon_path, img)) for img in os.listdir(icon_path) if img.endswith('.png')]
+    return max(mtimes + [os.path.getmtime(icon_path)])
+
+
+def is_stale(icon_path=ICON_PATH, atlas_path=ATLAS_PATH, cell_size=CELL_SIZE):
+    """
+    :param cell_size: the atlas is stale if its cells are smaller
+    """
+    index = os.path.join(atlas_path, ATLAS_INDEX)
+    if not os.path.isfile(index) or not os.path.isfile(os.path.join(atlas_path, ATLAS_IMAGE)):
+        return True
+
+    try:
+        with open(index) as index_file:
+            if json.load(index_file)['cell_size'] < cell_size:
+                return True
+    except (OSError, ValueError, KeyError):
+        return True
+
+    return newest_icon(icon_path) > os.path.getmtime(index)
+
+
+def load_atlas(icon_path=ICON_PATH, atlas_path=ATLAS_PATH, cell_size=CELL_SIZE):
+    """
+    :param cell_size: the largest icon size in px that is drawn, the atlas is rebuilt if its cells are smaller
+    """
+    if is_stale(icon_path, atlas_path, cell_size):
+        build_atlas(icon_path, atlas_path, cell_size)
+    return IconAtlas(atlas_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='pack the icons into one atlas image')
+    parser.add_argument('--size', type=int, default=CELL_SIZE, help='maximum icon size in px')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    build_atlas(cell_size=args.size)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Simulates many frames waking at the same instant and downloading the image.
+
+    python3 LoadTest.py --devices 50 --rounds 5 --url http://localhost:8642/
+"""
+
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+
+async def fetch(host, port, path, start):
+    """
+    downloads the path once, waits for the shared start event so all devices hit the server in the same instant
+
+    :return: (latency in seconds, status code, body bytes)
+    """
+    await start.wait()
+    begin = time.perf_counter()
+
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode('latin-1'))
+    await writer.drain()
+
+    response = await reader.read()
+    writer.close()
+
+    latency = time.perf_counter() - begin
+    head, _, body = response.partition(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1]) if head else 0
+
+    return latency, status, len(body)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def run(url, devices, rounds, pause):
+    parts = urlsplit(url)
+    host, port, path = parts.hostname, parts.port or 80, parts.path or '/'
+
+    latencies = []
+    statuses = {}
+    total_bytes = 0
+    errors = 0
+    elapsed = 0
+
+    for round_index in range(rounds):
+        start = asyncio.Event()
+        tasks = [asyncio.ensure_future(fetch(host, port, path, start)) for _ in range(devices)]
+
+        # let every task reach the start line before releasing them together
+        await asyncio.sleep(0.1)
+        begin = time.perf_counter()
+        start.set()
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        elapsed += time.perf_counter() - begin
+
+        for result in results:
+            if isinstance(result, Exception):
+                errors += 1
+                continue
+            latency, status, size = result
+            latencies.append(latency)
+            statuses[status] = statuses.get(status, 0) + 1
+            total_bytes += size
+
+        print(f'round {round_index + 1}/{rounds}: {devices} devices, p99 {percentile(latencies, 99) * 1000:.1f} ms')
+
+        if pause:
+            await asyncio.sleep(pause)
+
+    requests_done = len(latencies)
+    print()
+    print(f'requests:   {requests_done} ok, {errors} failed, status codes {statuses}')
+    print(f'latency:    p50 {percentile(latencies, 50) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms, '
+          f'max {max(latencies, default=0) * 1000:.1f} ms')
+    print(f'throughput: {requests_done / elapsed if elapsed else 0:.1f} req/s, '
+          f'{total_bytes / elapsed / 1024 / 1024 if elapsed else 0:.2f} MiB/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='load generation for the image server')
+    parser.add_argument('--url', default='http://localhost:8642/')
+    parser.add_argument('--devices', type=int, default=50, help='devices waking at the same instant')
+    parser.add_argument('--rounds', type=int, default=5, help='how often all devices wake')
+    parser.add_argument('--pause', type=float, default=1, help='seconds between rounds')
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url, args.devices, args.rounds, args.pause))
@@ -0,0 +1,56 @@
+import collections
+import os
+import resource
+import threading
+
+# events counted while running, e.g. skipped publications
+COUNTERS = collections.Counter()
+COUNTERS_LOCK = threading.Lock()
+
+
+def rss_kb():
+    """
+    :return: current resident set size in kB, the peak if /proc is not available
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return peak_rss_kb()
+
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def open_fds():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return -1
+
+
+def thread_count():
+    return threading.active_count()
+
+
+def count(name, amount=1):
+    with COUNTERS_LOCK:
+        COUNTERS[name] += amount
+
+
+def counters():
+    with COUNTERS_LOCK:
+        return dict(COUNTERS)
+
+
+def sample():
+    return dict({
+        'rss_kb': rss_kb(),
+        'peak_rss_kb': peak_rss_kb(),
+        'open_fds': open_fds(),
+        'threads': thread_count(),
+    }, **counters())
@@ -1,6 +1,16 @@
+import hashlib
+import json
+import os
+import sys
 from datetime import timedelta
-from WeatherPiEInk import config
-import requests
+import AsyncFetcher
+import ForecastCache
+
+PATH = sys.path[0] + "/"
+
+# read here instead of importing WeatherPiEInk, which would run the whole app a second time on import
+with open(os.path.join(PATH, 'config.json')) as f:
+    config = json.load(f)
 
 # Weather code (WMO):
 # 0	            Clear sky
@@ -17,6 +27,54 @@ import requests
 # 95 *	        Thunderstorm: Slight or moderate
 # 96, 99 *	    Thunderstorm with slight and heavy hail
 
+CACHE = None
+
+BREAKER = AsyncFetcher.CircuitBreaker(config['FETCH']['BREAKER_FAILURES'], config['FETCH']['BREAKER_RESET'],
+                                      config['FETCH']['BREAKER_MAX_RESET'])
+
+# the air quality api is a separate service, its outages must not open the forecast circuit
+AIR_QUALITY_BREAKER = AsyncFetcher.CircuitBreaker(config['FETCH']['BREAKER_FAILURES'],
+                                                  config['FETCH']['BREAKER_RESET'],
+                                                  config['FETCH']['BREAKER_MAX_RESET'])
+
+# series the render path indexes into, with the number of values it needs at least
+DAILY_SERIES = ('time', 'weathercode', 'sunrise', 'sunset', 'temperature_2m_max', 'temperature_2m_min', 'uv_index_max')
+HOURLY_SERIES = ('temperature_2m', 'precipitation_probability', 'relativehumidity_2m', 'windspeed_10m', 'weathercode')
+CURRENT_VALUES = ('relative_humidity_2m', 'pressure_msl', 'apparent_temperature')
+DAYS_NEEDED = 8
+HOURS_NEEDED = 48
+
+if config['FORECAST_CACHE']['ENABLED']:
+    CACHE = ForecastCache.ForecastCache(config['FORECAST_CACHE']['PATH'], config['FORECAST_CACHE']['TTL'])
+
+
+def validate_forecast(weather_response):
+    """
+    raises ValueError if the response misses anything get_weather() and the render path need,
+    so a partial answer never replaces the current data
+    """
+    for section, series, needed in (('daily', DAILY_SERIES, DAYS_NEEDED), ('hourly', HOURLY_SERIES, HOURS_NEEDED)):
+        for key in series:
+            values = weather_response[section][key]
+            if not isinstance(values, list) or len(values) < needed:
+                raise ValueError(f'{section}.{key} has less than {needed} values')
+            if any(value is None for value in values[:needed]):
+                raise ValueError(f'{section}.{key} has missing values')
+
+    for key in CURRENT_VALUES:
+        if not isinstance(weather_response['current'][key], (int, float)):
+            raise ValueError(f'current.{key} is not a number')
+
+
+def fetch_forecast(lat, lon, forecast_today_str, forecast_last_date_str):
+    url = config["OPENMETRO_URL"].format(lat, lon, config["OPENMETRO_TIMEZONE"], forecast_today_str,
+                                         forecast_last_date_str)
+    print('Weather API URL: ' + url)
+
+    return AsyncFetcher.fetch_json(url, config['FETCH']['CONNECT_TIMEOUT'], config['FETCH']['READ_TIMEOUT'],
+                                   config['FETCH']['HEDGE_AFTER'], validate=validate_forecast, breaker=BREAKER)
+
+
 def get_weather(current_datetime):
     time_delta = current_datetime + timedelta(days=7)
 
@@ -29,11 +87,18 @@ def get_weather(current_datetime):
                              + str(time_delta.month).zfill(2) + '-' \
                              + str(time_delta.day).zfill(2)
 
-    url = config["OPENMETRO_URL"].format(config["OPENMETRO_WEATHER_LAT"], config["OPENMETRO_WEATHER_LONG"],
-                                         config["OPENMETRO_TIMEZONE"], forecast_today_str, forecast_last_date_str)
-    print('Weather API URL: ' + url)
+    lat, lon = config["OPENMETRO_WEATHER_LAT"], config["OPENMETRO_WEATHER_LONG"]
+
+    if CACHE:
+        # all locations inside one model grid cell get the same forecast, fetch it once for all of them
+        lat, lon = ForecastCache.snap(lat, lon, config['FORECAST_CACHE']['GRID'])
+        url_hash = hashlib.sha1(config["OPENMETRO_URL"].encode('utf-8')).hexdigest()[:8]
+        key = f'{lat},{lon},{config["OPENMETRO_TIMEZONE"]},{forecast_today_str},{forecast_last_date_str},{url_hash}'
 
-    weather_response = requests.get(url).json()
+        weather_response = CACHE.get(key, lambda: fetch_forecast(lat, lon, forecast_today_str,
+                                                                 forecast_last_date_str))
+    else:
+        weather_response = fetch_forecast(lat, lon, forecast_today_str, forecast_last_date_str)
 
     return {
         'daily_dates': weather_response['daily']['time'][1:],
@@ -53,3 +118,28 @@ def get_weather(current_datetime):
         'apparent_temperature': weather_response['current']['apparent_temperature'],
         'uv_index_max': weather_response['daily']['uv_index_max'][0],
     }
+
+
+def validate_air_quality(air_quality_response):
+    if not isinstance(air_quality_response['current'][config['AIR_QUALITY']['INDEX']], (int, float)):
+        raise ValueError(f'current.{config["AIR_QUALITY"]["INDEX"]} is not a number')
+
+
+def get_air_quality(current_datetime):
+    url = config["OPENMETRO_AIR_QUALITY_URL"].format(config["OPENMETRO_WEATHER_LAT"], config["OPENMETRO_WEATHER_LONG"],
+                                                     config["OPENMETRO_TIMEZONE"])
+    print('Air quality API URL: ' + url)
+
+    air_quality_response = AsyncFetcher.fetch_json(url, config['FETCH']['CONNECT_TIMEOUT'],
+                                                   config['FETCH']['READ_TIMEOUT'], config['FETCH']['HEDGE_AFTER'],
+                                                   validate=validate_air_quality, breaker=AIR_QUALITY_BREAKER)
+
+    current = air_quality_response['current']
+
+    return {
+        'aqi': current[config['AIR_QUALITY']['INDEX']],
+        'european_aqi': current.get('european_aqi'),
+        'us_aqi': current.get('us_aqi'),
+        'pm10': current.get('pm10'),
+        'pm2_5': current.get('pm2_5'),
+    }
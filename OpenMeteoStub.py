@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the Open-Meteo forecast API, for trying the fetch path without network access.
+
+    python3 OpenMeteoStub.py --port 8650
+
+and set "OPENMETRO_URL" in config.json to the same query on http://localhost:8650/v1/forecast?...
+("OPENMETRO_AIR_QUALITY_URL" on http://localhost:8650/v1/air-quality?...).
+Every response is generated from the requested dates, the number of served requests is printed.
+Faults can be injected to try timeouts, hedging, validation and the circuit breaker:
+
+    python3 OpenMeteoStub.py --delay 6 --error-rate 0.2 --truncate-rate 0.1 --drop-rate 0.1 --stall-rate 0.1
+"""
+
+import argparse
+import datetime
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+REQUESTS = 0
+REQUESTS_LOCK = threading.Lock()
+
+# probabilities and delays of injected faults, set from the command line
+FAULTS = {'delay': 0, 'stall_rate': 0, 'error_rate': 0, 'truncate_rate': 0, 'drop_rate': 0}
+
+
+def forecast_payload(query):
+    start = datetime.date.fromisoformat(query.get('start_date', [datetime.date.today().isoformat()])[0])
+    end = datetime.date.fromisoformat(query.get('end_date', [(start + datetime.timedelta(days=7)).isoformat()])[0])
+    days = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+    hours = [datetime.datetime.combine(day, datetime.time(hour)) for day in days for hour in range(24)]
+
+    def temperature(hour):
+        return round(12 + 6 * math.sin((hour.hour - 9) / 24 * 2 * math.pi), 1)
+
+    return {
+        'latitude': float(query.get('latitude', ['0'])[0]),
+        'longitude': float(query.get('longitude', ['0'])[0]),
+        'current': {
+            'time': hours[0].isoformat(timespec='minutes'),
+            'relative_humidity_2m': 71,
+            'pressure_msl': 1015.2,
+            'apparent_temperature': 10.4,
+        },
+        'daily': {
+            'time': [day.isoformat() for day in days],
+            'weathercode': [(0, 2, 3, 61, 63, 71, 95)[i % 7] for i in range(len(days))],
+            'sunrise': [f'{day.isoformat()}T05:30' for day in days],
+            'sunset': [f'{day.isoformat()}T20:30' for day in days],
+            'temperature_2m_max': [18.0 + i % 4 for i in range(len(days))],
+            'temperature_2m_min': [8.0 + i % 3 for i in range(len(days))],
+            'uv_index_max': [4.5 for _ in days],
+        },
+        'hourly': {
+            'time': [hour.isoformat(timespec='minutes') for hour in hours],
+            'temperature_2m': [temperature(hour) for hour in hours],
+            'precipitation_probability': [(hour.hour * 7) % 100 for hour in hours],
+            'relativehumidity_2m': [70 for _ in hours],
+            'windspeed_10m': [9.5 for _ in hours],
+            'winddirection_10m': [240 for _ in hours],
+            'weathercode': [(0, 2, 3, 61)[hour.hour % 4] for hour in hours],
+        },
+    }
+
+
+def air_quality_payload(query):
+    return {
+        'latitude': float(query.get('latitude', ['0'])[0]),
+        'longitude': float(query.get('longitude', ['0'])[0]),
+        'current': {
+            'time': datetime.datetime.now().replace(minute=0, second=0, microsecond=0).isoformat(timespec='minutes'),
+            'european_aqi': 32,
+            'us_aqi': 41,
+            'pm10': 14.2,
+            'pm2_5': 8.9,
+        },
+    }
+
+
+PAYLOADS = {'/v1/forecast': forecast_payload, '/v1/air-quality': air_quality_payload}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        global REQUESTS
+
+        with REQUESTS_LOCK:
+            REQUESTS += 1
+            count = REQUESTS
+
+        url = urlsplit(self.path)
+        if url.path not in PAYLOADS:
+            self.send_error(404)
+            return
+
+        payload = PAYLOADS[url.path](parse_qs(url.query))
+        fault = 'none'
+
+        time.sleep(FAULTS['delay'])
+
+        if random.random() < FAULTS['stall_rate']:
+            # accept the request but never answer in time
+            fault = 'stall'
+            print(f'request {count}: {fault}')
+            time.sleep(600)
+            return
+
+        if random.random() < FAULTS['error_rate']:
+            print(f'request {count}: error')
+            self.send_error(500)
+            return
+
+        if random.random() < FAULTS['drop_rate']:
+            # valid json without a section the app needs
+            fault = 'dropped key'
+            del payload[random.choice([key for key in ('current', 'daily', 'hourly') if key in payload])]
+
+        body = json.dumps(payload).encode('utf-8')
+        length = len(body)
+
+        if random.random() < FAULTS['truncate_rate']:
+            # the connection ends before the announced length
+            fault = 'truncated'
+            body = body[:len(body) // 2]
+
+        print(f'request {count}: {self.path} fault: {fault}')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_stub(port=0):
+    """
+    :param port: 0 for any free port, the chosen one is in server.server_address
+    """
+    return ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+
+
+def run_stub(port):
+    server = create_stub(port)
+    print(f'Open-Meteo stub running on http://localhost:{server.server_address[1]}/v1/forecast')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='local stub of the Open-Meteo forecast api')
+    parser.add_argument('--port', type=int, default=8650)
+    parser.add_argument('--delay', type=float, default=0, help='seconds before every response')
+    parser.add_argument('--stall-rate', type=float, default=0, help='share of requests that never get an answer')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of requests answered with http 500')
+    parser.add_argument('--truncate-rate', type=float, default=0, help='share of responses cut in half')
+    parser.add_argument('--drop-rate', type=float, default=0, help='share of responses missing a section')
+    parser.add_argument('--seed', type=int, help='random seed to repeat a fault sequence')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    FAULTS.update(delay=args.delay, stall_rate=args.stall_rate, error_rate=args.error_rate,
+                  truncate_rate=args.truncate_rate, drop_rate=args.drop_rate)
+
+    run_stub(args.port)
@@ -0,0 +1,51 @@
+import pygame
+
+
+def palette(colors):
+    """
+    :param colors: the theme colors, they come first
+    :return: 256 palette entries, the rest is a gray ramp for anti aliased edges
+    """
+    entries = []
+    for color in colors:
+        if tuple(color) not in entries:
+            entries.append(tuple(color))
+    base = len(entries)
+    for i in range(256 - base):
+        gray = int(i * 255 / max(1, 255 - base))
+        entries.append((gray, gray, gray))
+    return entries[:256]
+
+
+def create_layer(size, colors=None):
+    """
+    :param colors: palette for an 8 bit layer, a quarter of the memory, None for a regular 32 bit one
+    """
+    if colors is None:
+        return pygame.Surface(size)
+
+    layer = pygame.Surface(size, 0, 8)
+    layer.set_palette(colors)
+    return layer
+
+
+def draw(layer, draw_function, rect=None):
+    """
+    runs draw_function on a region of the layer
+
+    SDL copies per pixel alpha sources onto 8 bit surfaces instead of blending them, anti aliased text, icons
+    and charts would end up with black boxes. 8 bit layers get a 32 bit scratch surface that is quantized
+    into the palette once the drawing is done.
+
+    :param draw_function: called with the surface to draw on, its (0, 0) is the top left of the region
+    :param rect: the region, the whole layer if None
+    """
+    rect = pygame.Rect(rect) if rect is not None else layer.get_rect()
+
+    if layer.get_bitsize() != 8:
+        draw_function(layer.subsurface(rect))
+        return
+
+    scratch = pygame.Surface(rect.size)
+    draw_function(scratch)
+    layer.blit(scratch, rect.topleft)
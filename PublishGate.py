@@ -0,0 +1,63 @@
+from PIL import ImageChops
+
+
+def changed_pixels(image, previous):
+    """
+    :return: percentage of pixels that differ in any channel between two RGB images of the same size
+    """
+    difference = ImageChops.difference(image, previous)
+    if difference.getbbox() is None:
+        return 0.0
+
+    red, green, blue = difference.split()
+    changed = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+    return 100 - changed.histogram()[0] * 100 / (image.width * image.height)
+
+
+class PublishGate(object):
+    """
+    Decides if a rendered frame differs enough from the last published one to be worth a refresh of the devices,
+    every published frame costs an e-ink frame a full refresh of ~40 seconds and battery.
+    """
+
+    def __init__(self, temperature_delta=0.5, changed_pixels=2.0):
+        """
+        :param temperature_delta: degrees a temperature has to move to be significant
+        :param changed_pixels: percentage of the frame that has to change to be significant
+        """
+        self.temperature_delta = temperature_delta
+        self.changed_pixels = changed_pixels
+        self.inputs = None
+        self.image = None
+
+    def significant(self, inputs, image):
+        """
+        compares against the last published frame, not the last rendered one, so small changes add up
+
+        :param inputs: dict with the 'clock_slot' of the frame and its 'temperatures' by name
+        :param image: the rendered frame as RGB PIL image
+        :return: (significant, reason)
+        """
+        if self.image is None or self.image.size != image.size:
+            return True, 'first frame'
+
+        if inputs['clock_slot'] != self.inputs['clock_slot']:
+            return True, f'clock slot {inputs["clock_slot"]}'
+
+        for name, temperature in inputs['temperatures'].items():
+            previous = self.inputs['temperatures'].get(name)
+            if temperature is None or previous is None:
+                if temperature != previous:
+                    return True, f'{name} {previous} -> {temperature}'
+            elif abs(temperature - previous) >= self.temperature_delta:
+                return True, f'{name} {previous} -> {temperature}'
+
+        changed = changed_pixels(image, self.image)
+        if changed >= self.changed_pixels:
+            return True, f'{round(changed, 2)}% pixels changed'
+
+        return False, f'{round(changed, 2)}% pixels changed'
+
+    def published(self, inputs, image):
+        self.inputs = inputs
+        self.image = image
@@ -0,0 +1,73 @@
+import hashlib
+import math
+import time
+
+
+class RefreshSchedule(object):
+    """
+    When frames are published and when each device should wake up to fetch them.
+    Frames are published at every multiple of interval, devices are spread over the jitter window after that.
+    """
+
+    def __init__(self, interval=120, window=30, settle=15, jitter=60):
+        """
+        :param interval: seconds between two published frames
+        :param window: seconds after the interval boundary in which publishing is allowed
+        :param settle: seconds a render takes until the new frame is on disk
+        :param jitter: devices wake up to this many seconds after the frame is ready
+        """
+        self.interval = int(interval)
+        self.window = int(window)
+        self.settle = int(settle)
+        self.jitter = int(jitter)
+
+    def publish_due(self, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        return self.local_seconds(timestamp) % self.interval < self.window
+
+    def next_publish(self, timestamp=None):
+        """
+        :return: unix timestamp of the next interval boundary, in local time so 2 minute intervals stay on even minutes
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        offset = time.localtime(timestamp).tm_gmtoff
+        return (math.floor((timestamp + offset) / self.interval) + 1) * self.interval - offset
+
+    def device_offset(self, device_id):
+        """
+        deterministic jitter of a device, the same device always gets the same offset
+        """
+        if not self.jitter:
+            return 0
+        digest = hashlib.sha1(str(device_id).encode('utf-8')).digest()
+        return int.from_bytes(digest[:4], 'big') % self.jitter
+
+    def hint(self, device_id, frame_timestamp=None, timestamp=None):
+        """
+        :return: dict with the current frame, the next publish and when this device should fetch next
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        next_publish = self.next_publish(timestamp)
+        next_refresh = next_publish + self.settle + self.device_offset(device_id)
+
+        return {
+            'frame_timestamp': frame_timestamp,
+            'next_publish': next_publish,
+            'next_refresh': next_refresh,
+            'sleep_seconds': max(0, int(math.ceil(next_refresh - timestamp))),
+        }
+
+    def headers(self, device_id, frame_timestamp=None, timestamp=None):
+        hint = self.hint(device_id, frame_timestamp, timestamp)
+        headers = {
+            'X-Next-Publish': str(int(hint['next_publish'])),
+            'X-Next-Refresh': str(int(hint['next_refresh'])),
+            'X-Refresh-After': str(hint['sleep_seconds']),
+        }
+        if frame_timestamp is not None:
+            headers['X-Frame-Timestamp'] = str(int(frame_timestamp))
+        return headers
+
+    @staticmethod
+    def local_seconds(timestamp):
+        return timestamp + time.localtime(timestamp).tm_gmtoff
@@ -0,0 +1,60 @@
+import logging
+import multiprocessing
+import signal
+import time
+
+logger = logging.getLogger(__package__)
+
+
+def reset_signals():
+    # pygame installs its own SIGTERM and SIGINT handlers, forked workers would inherit them and survive terminate()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+
+class RenderPool(object):
+    """
+    Renders several display profiles from one forecast snapshot in forked worker processes.
+    Processes instead of threads because pygame keeps global state and rendering holds the GIL.
+    Create the pool after fonts and icons are loaded, the workers share them copy-on-write.
+    """
+
+    def __init__(self, render, processes=None):
+        """
+        :param render: module level function render(profile, snapshot) returning a dict with at least 'name'
+        :param processes: worker count, defaults to the number of CPU cores
+        """
+        self.render = render
+        self.pool = multiprocessing.get_context('fork').Pool(processes, initializer=reset_signals)
+        self.pending = None
+        self.timings = {}
+
+    def submit(self, snapshot, profiles):
+        """
+        starts rendering all profiles in the background, skipped if the previous batch is still running
+        """
+        if self.pending is not None and not self.pending.ready():
+            logger.warning('render pool still busy, profiles skipped')
+            return False
+
+        start = time.perf_counter()
+        self.pending = self.pool.starmap_async(self.render, [(profile, snapshot) for profile in profiles],
+                                               callback=lambda results: self.done(results, start),
+                                               error_callback=self.failed)
+        return True
+
+    def done(self, results, start):
+        for result in results:
+            self.timings[result['name']] = result
+            logger.info(f'profile {result["name"]} rendered in {result["render_time"]}s, '
+                        f'encoded in {result["encode_time"]}s, {result["size"]} bytes')
+
+        logger.info(f'{len(results)} profiles rendered in {round(time.perf_counter() - start, 3)}s')
+
+    @staticmethod
+    def failed(render_ex):
+        logger.warning(f'profile render failed: {render_ex}')
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Runs the update and render path on a virtual clock with recorded forecasts, a week of operation takes minutes.
+Reports frames per second, memory, threads and open file descriptors to catch leaks before they reach a frame.
+
+    python3 Replay.py --days 7 --payloads logs_latest_weather.json
+    python3 Replay.py --days 7 --payloads history.sqlite --json replay_report.json
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+
+# no window is needed, must be set before pygame is imported
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import Metrics
+import WeatherHistory
+import WeatherPiEInk as app
+
+
+def load_payloads(path):
+    """
+    :param path: a json file like logs_latest_weather.json, a folder of them or a history.sqlite store
+    :return: list of weather dicts in recorded order
+    """
+    if path.endswith('.sqlite'):
+        history = WeatherHistory.WeatherHistory(path)
+        return [json.loads(row[1]) for row in history.range(app.SITE, 0, columns=('payload',)) if row[1]]
+
+    if os.path.isdir(path):
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.json')]
+    else:
+        files = [path]
+
+    payloads = []
+    for file in files:
+        with open(file) as payload_file:
+            data = json.load(payload_file)
+        payloads.append(data.get('weather', data))
+    return payloads
+
+
+def replay(payloads, days, step, sample_every, encode, publish):
+    # the latest weather, published frames, bands and status are written to a scratch folder,
+    # a replay must not overwrite the files of a running installation or the recording it replays
+    workdir = tempfile.mkdtemp(prefix='weatherpi_replay_')
+    cwd = os.getcwd()
+    app.LOG_PATH = os.path.join(workdir, 'logs')
+    os.chdir(workdir)
+
+    try:
+        return run(payloads, days, step, sample_every, encode, publish)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(payloads, days, step, sample_every, encode, publish):
+    app.images = app.image_factory(app.ICON_PATH)
+
+    # replayed forecasts must not end up in the real history
+    app.HISTORY = None
+
+    recorded = itertools.cycle(payloads)
+    app.WEATHER_SOURCE = lambda current_datetime: next(recorded)
+    app.SOURCES = [source for source in app.SOURCES if source.name == 'weather']
+
+    start = datetime.datetime.now().replace(second=0, microsecond=0)
+    update_every = app.config['TIMER']['UPDATE']
+    reload_every = app.config['TIMER']['RELOAD']
+
+    samples = []
+    frames = encoded = 0
+    real_start = time.perf_counter()
+
+    print(f'{"virtual time":<17} {"real s":>7} {"frames":>7} {"fps":>7} {"rss MB":>7} {"peak MB":>7} '
+          f'{"threads":>7} {"timers":>7} {"fds":>5}')
+
+    for tick in range(int(days * 86400 / step)):
+        virtual_seconds = tick * step
+        app.VIRTUAL_TIME = start + datetime.timedelta(seconds=virtual_seconds)
+
+        # the same order the timers of Update.run() fire in
+        if virtual_seconds % update_every < step:
+            app.Update.update_json()
+        if virtual_seconds % reload_every < step:
+            app.Update.read_json()
+
+        surf = app.compose_frame()
+        app.pygame.event.pump()
+        frames += 1
+
+        if encode and app.SCHEDULE.publish_due(app.VIRTUAL_TIME.timestamp()):
+            if publish:
+                # through the publish gate, skipped frames show up in the samples
+                app.publish(surf)
+            else:
+                app.encode_frame(app.surface_image(surf), app.config['ENCODER'])
+            encoded += 1
+
+        if tick % sample_every == 0:
+            real = time.perf_counter() - real_start
+            sample = dict(Metrics.sample(), virtual_time=app.VIRTUAL_TIME.isoformat(timespec='minutes'),
+                          real_seconds=round(real, 2), frames=frames, encoded=encoded,
+                          fps=round(frames / real, 1) if real else 0, timers=len(app.THREADS))
+            samples.append(sample)
+            print(f'{sample["virtual_time"]:<17} {sample["real_seconds"]:>7} {frames:>7} {sample["fps"]:>7} '
+                  f'{sample["rss_kb"] / 1024:>7.1f} {sample["peak_rss_kb"] / 1024:>7.1f} {sample["threads"]:>7} '
+                  f'{sample["timers"]:>7} {sample["open_fds"]:>5}')
+
+    real = time.perf_counter() - real_start
+    first, last = samples[0], Metrics.sample()
+    summary = {
+        'virtual_days': days,
+        'real_seconds': round(real, 2),
+        'frames': frames,
+        'encoded': encoded,
+        'publications_skipped': last.get('publications_skipped', 0),
+        'fps': round(frames / real, 1) if real else 0,
+        'rss_growth_kb': last['rss_kb'] - first['rss_kb'],
+        'peak_rss_kb': last['peak_rss_kb'],
+        'thread_growth': last['threads'] - first['threads'],
+        'fd_growth': last['open_fds'] - first['open_fds'],
+    }
+
+    print()
+    for key, value in summary.items():
+        print(f'{key:<15} {value}')
+
+    return {'summary': summary, 'samples': samples}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='time accelerated replay of the update and render path')
+    parser.add_argument('--payloads', default=app.LOG_PATH + '_latest_weather.json',
+                        help='json file, folder of json files or history .sqlite with recorded forecasts')
+    parser.add_argument('--days', type=float, default=7, help='virtual days to run')
+    parser.add_argument('--step', type=int, default=60, help='virtual seconds per rendered frame')
+    parser.add_argument('--sample', type=int, default=360, help='frames between two report lines')
+    parser.add_argument('--no-encode', action='store_true', help='skip encoding the published frames')
+    parser.add_argument('--publish', action='store_true', help='publish the encoded frames like the server does')
+    parser.add_argument('--json', help='write all samples to this file')
+    args = parser.parse_args()
+
+    report = replay(load_payloads(args.payloads), args.days, args.step, args.sample, not args.no_encode, args.publish)
+
+    if args.json:
+        with open(args.json, 'w') as outputfile:
+            json.dump(report, outputfile, indent=2)
+
+    app.quit_all()
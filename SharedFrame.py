@@ -0,0 +1,109 @@
+import logging
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+logger = logging.getLogger(__package__)
+
+# generation of the newest frame, slot it is in
+HEADER = struct.Struct('=QI4x')
+# sequence number, odd while the slot is written, then length of the info and the frame that follow
+SLOT = struct.Struct('=QII')
+
+READ_RETRIES = 100
+
+
+class SharedFrame(object):
+    """
+    Double buffered frame in shared memory, written by the renderer and read by the server process.
+    A frame is written into the slot readers are not using, then the header is switched to it.
+    Each slot carries a sequence number like a seqlock, so a reader never returns a partly written frame.
+    """
+
+    def __init__(self, name, capacity, create=False):
+        """
+        :param name: name of the shared memory segment
+        :param capacity: bytes for the frame and its info in each of the two slots
+        :param create: create the segment, a stale one left by a crashed run is replaced
+        """
+        self.capacity = capacity
+        self.slot_size = SLOT.size + capacity
+        self.owner = os.getpid() if create else None
+
+        if create:
+            size = HEADER.size + 2 * self.slot_size
+            try:
+                self.memory = shared_memory.SharedMemory(name, create=True, size=size)
+            except FileExistsError:
+                stale = shared_memory.SharedMemory(name)
+                stale.unlink()
+                stale.close()
+                self.memory = shared_memory.SharedMemory(name, create=True, size=size)
+            HEADER.pack_into(self.memory.buf, 0, 0, 0)
+        else:
+            self.memory = shared_memory.SharedMemory(name)
+
+        self.name = name
+
+    def slot_offset(self, slot):
+        return HEADER.size + slot * self.slot_size
+
+    @property
+    def generation(self):
+        return HEADER.unpack_from(self.memory.buf, 0)[0]
+
+    def write(self, data, info):
+        """
+        :param data: the encoded frame
+        :param info: the frame info as bytes
+        """
+        if len(data) + len(info) > self.capacity:
+            raise ValueError(f'frame of {len(data) + len(info)} bytes does not fit into {self.capacity} bytes')
+
+        buf = self.memory.buf
+        generation, active = HEADER.unpack_from(buf, 0)
+        slot = 1 - active
+        offset = self.slot_offset(slot)
+        start = offset + SLOT.size
+
+        # odd while writing, a reader that still copies this slot sees the change and retries
+        SLOT.pack_into(buf, offset, 2 * generation + 1, 0, 0)
+        buf[start:start + len(info)] = info
+        buf[start + len(info):start + len(info) + len(data)] = data
+        SLOT.pack_into(buf, offset, 2 * generation + 2, len(info), len(data))
+
+        # the swap, new readers take the new slot from here on
+        HEADER.pack_into(buf, 0, generation + 1, slot)
+
+    def read(self):
+        """
+        :return: (data, info) of the newest complete frame, (None, None) before the first one
+        """
+        buf = self.memory.buf
+
+        for _ in range(READ_RETRIES):
+            generation, active = HEADER.unpack_from(buf, 0)
+            if generation == 0:
+                return None, None
+
+            offset = self.slot_offset(active)
+            sequence, info_length, data_length = SLOT.unpack_from(buf, offset)
+            if sequence % 2:
+                time.sleep(0.001)
+                continue
+
+            start = offset + SLOT.size
+            info = bytes(buf[start:start + info_length])
+            data = bytes(buf[start + info_length:start + info_length + data_length])
+
+            if SLOT.unpack_from(buf, offset)[0] == sequence:
+                return data, info
+
+        logger.warning(f'{self.name}: no consistent frame after {READ_RETRIES} reads')
+        return None, None
+
+    def close(self):
+        self.memory.close()
+        if self.owner == os.getpid():
+            self.memory.unlink()
@@ -0,0 +1,154 @@
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+PATH = sys.path[0] + "/"
+
+logger = logging.getLogger(__package__)
+
+# Columns that are stored next to the raw payload, so trend queries never have to parse json
+SERIES = ('current_temperature', 'apparent_temperature', 'current_pressure', 'current_humidity',
+          'current_windspeed', 'current_weathercode')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    site TEXT NOT NULL,
+    fetched_at INTEGER NOT NULL,
+    current_temperature REAL,
+    apparent_temperature REAL,
+    current_pressure REAL,
+    current_humidity REAL,
+    current_windspeed REAL,
+    current_weathercode INTEGER,
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS history_site_time ON history (site, fetched_at);
+'''
+
+
+class WeatherHistory(object):
+    """
+    Append-only store of every fetched forecast, used for trend charts and forecast accuracy audits.
+    Rows are only ever inserted; retention and compaction are the only operations that remove data.
+    """
+
+    def __init__(self, db_path, retention_days=30, compact_after_days=2, payload_days=8, vacuum_pages=256):
+        """
+        :param db_path: sqlite file, relative paths are resolved against the project folder
+        :param retention_days: rows older than this are deleted
+        :param compact_after_days: rows older than this are thinned to one per hour
+        :param payload_days: rows older than this lose their payload, at least the forecast horizon,
+                             so a forecast can still be compared with the days it forecast
+        :param vacuum_pages: free pages after which the file is vacuumed to give space back
+        """
+        self.db_path = os.path.join(PATH, db_path)
+        self.retention = int(retention_days * 86400)
+        self.compact_after = int(compact_after_days * 86400)
+        self.payload_after = int(payload_days * 86400)
+        self.vacuum_pages = vacuum_pages
+
+        with self.connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def connect(self):
+        # a connection per call keeps the store safe to use from the timer threads
+        db = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def append(self, site, weather, fetched_at=None):
+        """
+        :param site: key of the location, e.g. "48,13"
+        :param weather: the dict returned by OpenMeteoApi.get_weather()
+        :param fetched_at: unix timestamp, defaults to now
+        """
+        fetched_at = int(fetched_at if fetched_at is not None else time.time())
+        row = [site, fetched_at] + [weather.get(key) for key in SERIES] + [json.dumps(weather, sort_keys=True)]
+
+        with self.connect() as db:
+            db.execute(f'INSERT INTO history (site, fetched_at, {", ".join(SERIES)}, payload) '
+                       f'VALUES ({", ".join("?" * len(row))})', row)
+
+        logger.debug(f'history row appended for {site} at {fetched_at}')
+
+    def range(self, site, start, end=None, columns=SERIES):
+        """
+        yields (fetched_at, *columns) rows between start and end, oldest first, without loading the range into memory
+        """
+        columns = [c for c in columns if c in SERIES + ('payload',)]
+        end = end if end is not None else time.time()
+
+        with self.connect() as db:
+            cursor = db.execute(f'SELECT fetched_at, {", ".join(columns)} FROM history '
+                                f'WHERE site = ? AND fetched_at >= ? AND fetched_at <= ? ORDER BY fetched_at',
+                                (site, int(start), int(end)))
+            for row in cursor:
+                yield row
+
+    def trend(self, site, column, days=7, buckets=84, now=None):
+        """
+        averages a column into equally sized time buckets, the aggregation is done by sqlite using the index
+
+        :return: list of at most buckets (bucket_start, average) tuples, empty buckets are left out
+        """
+        if column not in SERIES:
+            raise ValueError(f'unknown history column: {column}')
+
+        now = int(now if now is not None else time.time())
+        start = now - int(days * 86400)
+        bucket_size = max(1, int(days * 86400 / buckets))
+
+        with self.connect() as db:
+            # rows at now and the remainder of the rounded bucket size go into the last bucket
+            rows = db.execute(f'SELECT MIN((fetched_at - ?) / ?, ?) AS bucket, AVG({column}) FROM history '
+                              f'WHERE site = ? AND fetched_at >= ? AND fetched_at <= ? AND {column} IS NOT NULL '
+                              f'GROUP BY bucket ORDER BY bucket',
+                              (start, bucket_size, buckets - 1, site, start, now)).fetchall()
+
+        return [(start + bucket * bucket_size, value) for bucket, value in rows]
+
+    def pressure_trend(self, site, days=7, buckets=84, now=None):
+        return self.trend(site, 'current_pressure', days, buckets, now)
+
+    def compact(self, now=None):
+        """
+        deletes rows past the retention, thins older rows to one per hour, drops the payloads past payload_days
+        and vacuums if enough pages are free
+        """
+        now = int(now if now is not None else time.time())
+
+        with self.connect() as db:
+            expired = db.execute('DELETE FROM history WHERE fetched_at < ?', (now - self.retention,)).rowcount
+
+            # keep the first row of each hour and site, drop the rest
+            thinned = db.execute('DELETE FROM history WHERE fetched_at < ? AND id NOT IN '
+                                 '(SELECT MIN(id) FROM history WHERE fetched_at < ? '
+                                 'GROUP BY site, fetched_at / 3600)',
+                                 (now - self.compact_after, now - self.compact_after)).rowcount
+
+            db.execute('UPDATE history SET payload = NULL WHERE fetched_at < ? AND payload IS NOT NULL',
+                       (now - self.payload_after,))
+
+            free_pages = db.execute('PRAGMA freelist_count').fetchone()[0]
+
+        if free_pages >= self.vacuum_pages:
+            # VACUUM can not run inside a transaction
+            db = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            try:
+                db.execute('VACUUM')
+            finally:
+                db.close()
+
+        logger.info(f'history compacted: {expired} expired, {thinned} thinned, {free_pages} free pages')
+
+        return expired, thinned
@@ -27,20 +27,34 @@
 # SOFTWARE.
 
 import datetime
+import io
 import json
 import locale
 import logging
 import math
+import multiprocessing
 import os
 import sys
 import threading
 import time
 import OpenMeteoApi
+import AsyncFetcher
+import ConfigWatcher
+import Framebuffer
+import DataSources
+import IconAtlas
+import FrameEncoder
+import Metrics
+import PaletteLayer
+import WeatherHistory
 import pygame
 import pygame.gfxdraw
-import requests
 from PIL import Image, ImageDraw
 import Webserver
+import AsyncWebserver
+from RefreshSchedule import RefreshSchedule
+from RenderPool import RenderPool
+from PublishGate import PublishGate
 
 PATH = sys.path[0] + "/"
 ICON_PATH = os.path.join(PATH, 'icons')
@@ -69,10 +83,13 @@ logger.addHandler(ch)
 config_data = open(os.path.join(PATH, 'config.json')).read()
 config = json.loads(config_data)
 
-theme_config = config["THEME"]
 
-theme_settings = open(os.path.join(PATH, theme_config)).read()
-theme = json.loads(theme_settings)
+def load_theme(theme_config):
+    theme_settings = open(os.path.join(PATH, theme_config)).read()
+    return json.loads(theme_settings)
+
+
+theme = load_theme(config["THEME"])
 
 SERVER = config['OPENMETRO_URL']
 METRIC = config['LOCALE']['METRIC']
@@ -81,13 +98,68 @@ locale.setlocale(locale.LC_ALL, (config['LOCALE']['ISO'], 'UTF-8'))
 
 THREADS = []
 
+RENDER_POOL = None
+
+# set by Replay.py to run on a virtual clock, timers are not started then
+VIRTUAL_TIME = None
+
+# returns the weather dict for a datetime, Replay.py feeds recorded forecasts through this
+WEATHER_SOURCE = OpenMeteoApi.get_weather
+
+
+def create_sources():
+    # fetched at the same time on every update, each under its name in the json file
+    sources = [DataSources.DataSource('weather', lambda current_datetime: WEATHER_SOURCE(current_datetime))]
+
+    if config['AIR_QUALITY']['ENABLED']:
+        sources.append(DataSources.DataSource('air_quality', OpenMeteoApi.get_air_quality))
+
+    return sources
+
+
+SOURCES = create_sources()
+
+LATEST_DATA = None
+
+
+def current_time():
+    return VIRTUAL_TIME if VIRTUAL_TIME is not None else datetime.datetime.now()
+
+
+def start_timer(interval, function):
+    global THREADS
+
+    if VIRTUAL_TIME is not None:
+        return
+
+    thread = threading.Timer(interval, function)
+
+    thread.start()
+
+    THREADS.append(thread)
+
+
+SCHEDULE = RefreshSchedule(config['PUBLISH']['INTERVAL'], config['PUBLISH']['WINDOW'],
+                           config['PUBLISH']['SETTLE'], config['PUBLISH']['JITTER'])
+
 def start_server():
-    Webserver.run_server()
+    if config["SERVER_ASYNC"]:
+        AsyncWebserver.run_server()
+    else:
+        Webserver.run_server()
+
+SERVER_PROCESS = None
 
 if config["SERVER_MODE"]:
-    # Start webserver in a separate thread
-    server_thread = threading.Thread(target=start_server, daemon=True)
-    server_thread.start()
+    if config["SERVER_PROCESS"]:
+        # frames are handed over in shared memory, rendering can not hold up a request
+        Webserver.open_shared()
+        SERVER_PROCESS = multiprocessing.get_context('fork').Process(target=start_server, daemon=True)
+        SERVER_PROCESS.start()
+    else:
+        # Start webserver in a separate thread
+        server_thread = threading.Thread(target=start_server, daemon=True)
+        server_thread.start()
 
 WMO_TO_IMG = {
     0: "c01",  # Clear sky
@@ -120,9 +192,15 @@ WMO_TO_IMG = {
     99: "t05",  # Thunderstorm with heavy hail
 }
 
+# frames are written into the framebuffer by Framebuffer.py, SDL needs no video output for that
+FRAMEBUFFER_DIRECT = config['DISPLAY']['FRAMEBUFFER'] is not False and config['DISPLAY']['FRAMEBUFFER_DIRECT']
+
 try:
+    if FRAMEBUFFER_DIRECT:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+
     if config['ENV'] == 'Pi':
-        if config['DISPLAY']['FRAMEBUFFER'] is not False:
+        if config['DISPLAY']['FRAMEBUFFER'] is not False and not FRAMEBUFFER_DIRECT:
             # using the dashboard on a raspberry with TFT displays might make this necessary
             os.putenv('SDL_FBDEV', config['DISPLAY']['FRAMEBUFFER'])
             os.environ["SDL_VIDEODRIVER"] = "fbcon"
@@ -148,6 +226,17 @@ def quit_all():
 
     global THREADS
 
+    if RENDER_POOL:
+        RENDER_POOL.close()
+
+    if FRAMEBUFFER:
+        FRAMEBUFFER.close()
+
+    if SERVER_PROCESS:
+        SERVER_PROCESS.terminate()
+        SERVER_PROCESS.join()
+        Webserver.close_shared()
+
     for thread in THREADS:
         logger.info(f'Thread killed {thread}')
         thread.cancel()
@@ -156,118 +245,218 @@ def quit_all():
     sys.exit()
 
 
-# display settings from theme config
-DISPLAY_WIDTH = int(config["DISPLAY"]["WIDTH"])
-DISPLAY_HEIGHT = int(config["DISPLAY"]["HEIGHT"])
+# the layout coordinates are meant for this size, other sizes are zoomed
+LAYOUT_WIDTH = 800
+LAYOUT_HEIGHT = 480
+# the current weather icon, the largest icon of the layout
+LARGEST_ICON = 120
 
-# the drawing area to place all text and img on
-SURFACE_WIDTH = DISPLAY_WIDTH
-SURFACE_HEIGHT = DISPLAY_HEIGHT
+FONT_DATA = {}
+FONT_CACHE = {}
 
-SCALE = float(DISPLAY_WIDTH / SURFACE_WIDTH)
-ZOOM = 1
 
-AA = config['DISPLAY']['AA']
+def profile_zoom(profile):
+    # render profiles without a ZOOM fit the layout into their size
+    return profile.get('ZOOM', min(profile['WIDTH'] / LAYOUT_WIDTH, profile['HEIGHT'] / LAYOUT_HEIGHT))
+
+
+def apply_display(width, height, zoom=None):
+    """
+    sets the display and surface geometry, the whole layout is scaled by ZOOM
+
+    :param zoom: fixed zoom for render profiles, computed from the display size if None
+    """
+    global DISPLAY_WIDTH, DISPLAY_HEIGHT, SURFACE_WIDTH, SURFACE_HEIGHT, SCALE, ZOOM, FIT_SCREEN
+
+    # display settings from theme config
+    DISPLAY_WIDTH = int(width)
+    DISPLAY_HEIGHT = int(height)
+
+    # the drawing area to place all text and img on
+    SURFACE_WIDTH = DISPLAY_WIDTH
+    SURFACE_HEIGHT = DISPLAY_HEIGHT
+
+    SCALE = float(DISPLAY_WIDTH / SURFACE_WIDTH)
+    ZOOM = 1
+
+    if zoom is not None:
+        ZOOM = zoom
+        FIT_SCREEN = (0, 0)
+        logger.info(f'SURFACE_WIDTH: {SURFACE_WIDTH} SURFACE_HEIGHT: {SURFACE_HEIGHT} ZOOM: {ZOOM}')
+        return
+
+    # correction for 1:1 displays like hyperpixel4 square
+    if DISPLAY_WIDTH / DISPLAY_HEIGHT == 1:
+        logger.info(f'square display configuration detected')
+        square_width = int(DISPLAY_WIDTH / float(4 / 3))
+        SCALE = float(square_width / SURFACE_WIDTH)
+
+        logger.info(f'scale and display correction caused by square display')
+        logger.info(f'DISPLAY_WIDTH: {square_width} new SCALE: {SCALE}')
+        logger.info(f'DISPLAY_WIDTH: {square_width} new SCALE: {SCALE}')
 
-# correction for 1:1 displays like hyperpixel4 square
-if DISPLAY_WIDTH / DISPLAY_HEIGHT == 1:
-    logger.info(f'square display configuration detected')
-    square_width = int(DISPLAY_WIDTH / float(4 / 3))
-    SCALE = float(square_width / SURFACE_WIDTH)
-
-    logger.info(f'scale and display correction caused by square display')
-    logger.info(f'DISPLAY_WIDTH: {square_width} new SCALE: {SCALE}')
-    logger.info(f'DISPLAY_WIDTH: {square_width} new SCALE: {SCALE}')
-
-# check if a landscape display is configured
-if DISPLAY_WIDTH > DISPLAY_HEIGHT:
-    logger.info(f'landscape display configuration detected')
-    SCALE = float(DISPLAY_HEIGHT / SURFACE_HEIGHT)
-
-    logger.info(f'scale and display correction caused by landscape display')
-    logger.info(f'DISPLAY_HEIGHT: {DISPLAY_HEIGHT} new SCALE: {SCALE}')
-
-# zoom the application surface rendering to display size scale
-if SCALE != 1:
-    ZOOM = SCALE
-
-    if DISPLAY_HEIGHT < SURFACE_HEIGHT:
-        logger.info('screen smaller as surface area - zooming smaller')
-        SURFACE_HEIGHT = DISPLAY_HEIGHT
-        SURFACE_WIDTH = int(SURFACE_HEIGHT / (4 / 3))
-        logger.info(f'surface correction caused by small display')
-        if DISPLAY_WIDTH == DISPLAY_HEIGHT:
-            logger.info('small and square')
-            ZOOM = round(ZOOM, 2)
+    # check if a landscape display is configured
+    if DISPLAY_WIDTH > DISPLAY_HEIGHT:
+        logger.info(f'landscape display configuration detected')
+        SCALE = float(DISPLAY_HEIGHT / SURFACE_HEIGHT)
+
+        logger.info(f'scale and display correction caused by landscape display')
+        logger.info(f'DISPLAY_HEIGHT: {DISPLAY_HEIGHT} new SCALE: {SCALE}')
+
+    # zoom the application surface rendering to display size scale
+    if SCALE != 1:
+        ZOOM = SCALE
+
+        if DISPLAY_HEIGHT < SURFACE_HEIGHT:
+            logger.info('screen smaller as surface area - zooming smaller')
+            SURFACE_HEIGHT = DISPLAY_HEIGHT
+            SURFACE_WIDTH = int(SURFACE_HEIGHT / (4 / 3))
+            logger.info(f'surface correction caused by small display')
+            if DISPLAY_WIDTH == DISPLAY_HEIGHT:
+                logger.info('small and square')
+                ZOOM = round(ZOOM, 2)
+            else:
+                ZOOM = round(ZOOM, 1)
+            logger.info(f'zoom correction caused by small display')
         else:
-            ZOOM = round(ZOOM, 1)
-        logger.info(f'zoom correction caused by small display')
-    else:
-        logger.info('screen bigger as surface area - zooming bigger')
-        SURFACE_WIDTH = int(DISPLAY_WIDTH * ZOOM)
-        SURFACE_HEIGHT = int(DISPLAY_HEIGHT * ZOOM)
-        logger.info(f'surface correction caused by bigger display')
+            logger.info('screen bigger as surface area - zooming bigger')
+            SURFACE_WIDTH = int(DISPLAY_WIDTH * ZOOM)
+            SURFACE_HEIGHT = int(DISPLAY_HEIGHT * ZOOM)
+            logger.info(f'surface correction caused by bigger display')
+
+        logger.info(f'SURFACE_WIDTH: {SURFACE_WIDTH} SURFACE_HEIGHT: {SURFACE_HEIGHT} ZOOM: {ZOOM}')
+
+    FIT_SCREEN = (int((DISPLAY_WIDTH - SURFACE_WIDTH) / 2), int((DISPLAY_HEIGHT - SURFACE_HEIGHT) / 2))
+
+
+def load_font(name, size):
+    # the font files are read once, render workers forked later share the bytes
+    if (name, size) not in FONT_CACHE:
+        if name not in FONT_DATA:
+            with open(os.path.join(FONT_PATH, name), 'rb') as font_file:
+                FONT_DATA[name] = font_file.read()
+        FONT_CACHE[(name, size)] = pygame.font.Font(io.BytesIO(FONT_DATA[name]), size)
+    return FONT_CACHE[(name, size)]
+
+
+def apply_theme(new_theme):
+    """
+    sets the colors and fonts of a theme, font sizes are scaled by the current ZOOM
+    """
+    global theme, BACKGROUND, MAIN_FONT, MOONLIGHT, MOONDARK, BLACK, DARK_GRAY, WHITE, RED, GREEN, BLUE, LIGHT_BLUE, \
+        DARK_BLUE, YELLOW, DARK_YELLOW, ORANGE, VIOLET, COLOR_LIST, FONT_REGULAR, FONT_BOLD, DATE_SIZE, CLOCK_SIZE, \
+        SMALLEST_SIZE, SMALL_SIZE, MEDIUM_SIZE, BIG_SIZE, HUGE_SIZE, FONT_SMALLEST, FONT_SMALLEST_BOLD, FONT_SMALL, \
+        FONT_SMALL_BOLD, FONT_MEDIUM, FONT_MEDIUM_BOLD, FONT_BIG, FONT_BIG_BOLD, FONT_HUGE, DATE_FONT, CLOCK_FONT
+
+    theme = new_theme
+
+    BACKGROUND = tuple(theme["COLOR"]["BACKGROUND"])
+    MAIN_FONT = tuple(theme["COLOR"]["MAIN_FONT"])
+    MOONLIGHT = tuple(theme["COLOR"]["MOONLIGHT"])
+    MOONDARK = tuple(theme["COLOR"]["MOONDARK"])
+    BLACK = tuple(theme["COLOR"]["BLACK"])
+    DARK_GRAY = tuple(theme["COLOR"]["DARK_GRAY"])
+    WHITE = tuple(theme["COLOR"]["WHITE"])
+    RED = tuple(theme["COLOR"]["RED"])
+    GREEN = tuple(theme["COLOR"]["GREEN"])
+    BLUE = tuple(theme["COLOR"]["BLUE"])
+    LIGHT_BLUE = tuple((BLUE[0], 210, BLUE[2]))
+    DARK_BLUE = tuple((BLUE[0], 100, 255))
+    YELLOW = tuple(theme["COLOR"]["YELLOW"])
+    DARK_YELLOW = tuple(theme["COLOR"]["DARK_YELLOW"])
+    ORANGE = tuple(theme["COLOR"]["ORANGE"])
+    VIOLET = tuple(theme["COLOR"]["VIOLET"])
+    COLOR_LIST = [BLUE, LIGHT_BLUE, DARK_BLUE]
+
+    FONT_REGULAR = theme["FONT"]["MEDIUM"]
+    FONT_BOLD = theme["FONT"]["BOLD"]
+    DATE_SIZE = int(theme["FONT"]["DATE_SIZE"] * ZOOM)
+    CLOCK_SIZE = int(theme["FONT"]["CLOCK_SIZE"] * ZOOM)
+    SMALLEST_SIZE = int(theme["FONT"]["SMALLEST_SIZE"] * ZOOM)
+    SMALL_SIZE = int(theme["FONT"]["SMALL_SIZE"] * ZOOM)
+    MEDIUM_SIZE = int(theme["FONT"]["MEDIUM_SIZE"] * ZOOM)
+    BIG_SIZE = int(theme["FONT"]["BIG_SIZE"] * ZOOM)
+    HUGE_SIZE = int(theme["FONT"]["HUGE_SIZE"] * ZOOM)
+
+    FONT_SMALLEST = load_font(FONT_REGULAR, SMALLEST_SIZE)
+    FONT_SMALLEST_BOLD = load_font(FONT_BOLD, SMALLEST_SIZE)
+    FONT_SMALL = load_font(FONT_REGULAR, SMALL_SIZE)
+    FONT_SMALL_BOLD = load_font(FONT_BOLD, SMALL_SIZE)
+    FONT_MEDIUM = load_font(FONT_REGULAR, MEDIUM_SIZE)
+    FONT_MEDIUM_BOLD = load_font(FONT_BOLD, MEDIUM_SIZE)
+    FONT_BIG = load_font(FONT_REGULAR, BIG_SIZE)
+    FONT_BIG_BOLD = load_font(FONT_BOLD, BIG_SIZE)
+    FONT_HUGE = load_font(FONT_REGULAR, HUGE_SIZE)
+    FONT_BIG_BOLD = load_font(FONT_BOLD, HUGE_SIZE)
+    DATE_FONT = load_font(FONT_BOLD, DATE_SIZE)
+    CLOCK_FONT = load_font(FONT_BOLD, CLOCK_SIZE)
+
+
+apply_display(config["DISPLAY"]["WIDTH"], config["DISPLAY"]["HEIGHT"])
+
+AA = config['DISPLAY']['AA']
+
+# Pi Zero class hosts: one reused composite surface instead of full screen layers
+LOW_MEMORY = config['DISPLAY']['LOW_MEMORY']
+PALETTE = config['DISPLAY']['PALETTE']
+
+apply_theme(theme)
+
+
+def palette_colors():
+    """
+    the theme colors first, the rest of the 256 entries is a gray ramp for anti aliased edges
+    """
+    return PaletteLayer.palette(list(theme["COLOR"].values()) + [LIGHT_BLUE, DARK_BLUE])
 
-    logger.info(f'SURFACE_WIDTH: {SURFACE_WIDTH} SURFACE_HEIGHT: {SURFACE_HEIGHT} ZOOM: {ZOOM}')
 
-FIT_SCREEN = (int((DISPLAY_WIDTH - SURFACE_WIDTH) / 2), int((DISPLAY_HEIGHT - SURFACE_HEIGHT) / 2))
+def create_layer(size):
+    # 8 bit per pixel, a quarter of the memory, the e-ink panel can only show a few colors anyway
+    return PaletteLayer.create_layer(size, palette_colors() if PALETTE else None)
+
+
+def time_rect():
+    # the region of the clock and the date, the only part that changes between weather updates
+    return pygame.Rect(0, 0, SURFACE_WIDTH, int(68 * ZOOM) + DATE_FONT.get_height())
+
+
+# reentrant, loop() holds it around compose_frame() which takes it as well
+SURFACE_LOCK = threading.RLock()
 
 # the real display surface
 tft_surf = pygame.display.set_mode((DISPLAY_WIDTH, DISPLAY_HEIGHT), pygame.NOFRAME if config['ENV'] == 'Pi' else 0)
 
-# the drawing area - everything will be drawn here before scaling and rendering on the display tft_surf
-display_surf = pygame.Surface((SURFACE_WIDTH, SURFACE_HEIGHT))
-# dynamic surface for status bar updates and dynamic values like fps
-dynamic_surf = pygame.Surface((SURFACE_WIDTH, SURFACE_HEIGHT))
-# exclusive surface for the time
-time_surf = pygame.Surface((SURFACE_WIDTH, SURFACE_HEIGHT))
-# surface for the weather data - will only be created once if the data is updated from the api
-weather_surf = pygame.Surface((SURFACE_WIDTH, SURFACE_HEIGHT))
+if LOW_MEMORY:
+    # the weather is drawn straight into the composite surface, only the clock region is redrawn each frame
+    display_surf = create_layer((SURFACE_WIDTH, SURFACE_HEIGHT))
+    weather_surf = display_surf
+    dynamic_surf = None
+    time_surf = None
+    # what is behind the clock, to restore it before the clock is drawn again
+    time_background = create_layer(time_rect().size)
+else:
+    # the drawing area - everything will be drawn here before scaling and rendering on the display tft_surf
+    display_surf = pygame.Surface((SURFACE_WIDTH, SURFACE_HEIGHT))
+    # dynamic surface for status bar updates and dynamic values like fps
+    dynamic_surf = pygame.Surface((SURFACE_WIDTH, SURFACE_HEIGHT))
+    # exclusive surface for the time
+    time_surf = pygame.Surface((SURFACE_WIDTH, SURFACE_HEIGHT))
+    # surface for the weather data - will only be created once if the data is updated from the api
+    weather_surf = pygame.Surface((SURFACE_WIDTH, SURFACE_HEIGHT))
+
+FRAMEBUFFER = None
+
+if FRAMEBUFFER_DIRECT:
+    FRAMEBUFFER = Framebuffer.Framebuffer(config['DISPLAY']['FRAMEBUFFER'], DISPLAY_WIDTH, DISPLAY_HEIGHT,
+                                          config['DISPLAY']['FRAMEBUFFER_BPP'])
 
 clock = pygame.time.Clock()
 
 logger.info(f'display with {DISPLAY_WIDTH}px width and {DISPLAY_HEIGHT}px height is set with AA {AA}')
+logger.info(f'low memory mode: {LOW_MEMORY} palette surfaces: {PALETTE}')
 
-BACKGROUND = tuple(theme["COLOR"]["BACKGROUND"])
-MAIN_FONT = tuple(theme["COLOR"]["MAIN_FONT"])
-MOONLIGHT = tuple(theme["COLOR"]["MOONLIGHT"])
-MOONDARK = tuple(theme["COLOR"]["MOONDARK"])
-BLACK = tuple(theme["COLOR"]["BLACK"])
-DARK_GRAY = tuple(theme["COLOR"]["DARK_GRAY"])
-WHITE = tuple(theme["COLOR"]["WHITE"])
-RED = tuple(theme["COLOR"]["RED"])
-GREEN = tuple(theme["COLOR"]["GREEN"])
-BLUE = tuple(theme["COLOR"]["BLUE"])
-LIGHT_BLUE = tuple((BLUE[0], 210, BLUE[2]))
-DARK_BLUE = tuple((BLUE[0], 100, 255))
-YELLOW = tuple(theme["COLOR"]["YELLOW"])
-DARK_YELLOW = tuple(theme["COLOR"]["DARK_YELLOW"])
-ORANGE = tuple(theme["COLOR"]["ORANGE"])
-VIOLET = tuple(theme["COLOR"]["VIOLET"])
-COLOR_LIST = [BLUE, LIGHT_BLUE, DARK_BLUE]
-
-FONT_REGULAR = theme["FONT"]["MEDIUM"]
-FONT_BOLD = theme["FONT"]["BOLD"]
-DATE_SIZE = int(theme["FONT"]["DATE_SIZE"] * ZOOM)
-CLOCK_SIZE = int(theme["FONT"]["CLOCK_SIZE"] * ZOOM)
-SMALLEST_SIZE = int(theme["FONT"]["SMALLEST_SIZE"] * ZOOM)
-SMALL_SIZE = int(theme["FONT"]["SMALL_SIZE"] * ZOOM)
-MEDIUM_SIZE = int(theme["FONT"]["MEDIUM_SIZE"] * ZOOM)
-BIG_SIZE = int(theme["FONT"]["BIG_SIZE"] * ZOOM)
-HUGE_SIZE = int(theme["FONT"]["HUGE_SIZE"] * ZOOM)
-
-FONT_SMALLEST = pygame.font.Font(os.path.join(FONT_PATH, FONT_REGULAR), SMALLEST_SIZE)
-FONT_SMALLEST_BOLD = pygame.font.Font(os.path.join(FONT_PATH, FONT_BOLD), SMALLEST_SIZE)
-FONT_SMALL = pygame.font.Font(os.path.join(FONT_PATH, FONT_REGULAR), SMALL_SIZE)
-FONT_SMALL_BOLD = pygame.font.Font(os.path.join(FONT_PATH, FONT_BOLD), SMALL_SIZE)
-FONT_MEDIUM = pygame.font.Font(os.path.join(FONT_PATH, FONT_REGULAR), MEDIUM_SIZE)
-FONT_MEDIUM_BOLD = pygame.font.Font(os.path.join(FONT_PATH, FONT_BOLD), MEDIUM_SIZE)
-FONT_BIG = pygame.font.Font(os.path.join(FONT_PATH, FONT_REGULAR), BIG_SIZE)
-FONT_BIG_BOLD = pygame.font.Font(os.path.join(FONT_PATH, FONT_BOLD), BIG_SIZE)
-FONT_HUGE = pygame.font.Font(os.path.join(FONT_PATH, FONT_REGULAR), HUGE_SIZE)
-FONT_BIG_BOLD = pygame.font.Font(os.path.join(FONT_PATH, FONT_BOLD), HUGE_SIZE)
-DATE_FONT = pygame.font.Font(os.path.join(FONT_PATH, FONT_BOLD), DATE_SIZE)
-CLOCK_FONT = pygame.font.Font(os.path.join(FONT_PATH, FONT_BOLD), CLOCK_SIZE)
+if PALETTE and not LOW_MEMORY:
+    logger.warning('DISPLAY.PALETTE only applies together with DISPLAY.LOW_MEMORY')
 
 WEATHERICON = 'unknown'
 
@@ -282,17 +471,26 @@ READING = False
 UPDATING = False
 
 JSON_DATA_WEATHER = {}
+JSON_DATA_AIR = {}
+
+MOON_CACHE = {}
+
+SITE = f'{config["OPENMETRO_WEATHER_LAT"]},{config["OPENMETRO_WEATHER_LONG"]}'
+
+HISTORY = None
+HISTORY_COMPACTED = 0
+
+if config['HISTORY']['ENABLED']:
+    HISTORY = WeatherHistory.WeatherHistory(config['HISTORY']['PATH'],
+                                            retention_days=config['HISTORY']['RETENTION_DAYS'],
+                                            compact_after_days=config['HISTORY']['COMPACT_AFTER_DAYS'],
+                                            payload_days=config['HISTORY']['PAYLOAD_DAYS'])
 
 
 def image_factory(image_path):
-    result = {}
-    for img in os.listdir(image_path):
-        image_id = img.split('.')[0]
-        if image_id == "":
-            pass
-        else:
-            result[image_id] = Image.open(os.path.join(image_path, img))
-    return result
+    # all icons come from one packed atlas, it is rebuilt when an icon changed or a zoom needs larger icons
+    zoom = max([ZOOM] + [profile_zoom(profile) for profile in config['PROFILES']])
+    return IconAtlas.load_atlas(image_path, cell_size=max(IconAtlas.CELL_SIZE, math.ceil(LARGEST_ICON * zoom)))
 
 
 class DrawString:
@@ -467,110 +665,135 @@ class DrawImage:
 
 
 def draw_hourly_temp(surf, y, size_x, size_y, hourly_temperatures, width=2, lower_offset=10):
-    image = Image.new("RGBA", (size_x , size_y+width+lower_offset))
+    """
+    :param y: layout coordinates like DrawString and DrawImage, the chart is zoomed here
+    """
+    chart_x, chart_y = int(size_x * ZOOM), int(size_y * ZOOM)
+    line, lower = max(1, int(width * ZOOM)), int(lower_offset * ZOOM)
+
+    image = Image.new("RGBA", (chart_x, chart_y + line + lower))
     draw = ImageDraw.Draw(image)
 
     temp_min = min(hourly_temperatures)
     temp_max = max(hourly_temperatures)
 
-    segment_x_size = size_x / len(hourly_temperatures)
+    segment_x_size = chart_x / len(hourly_temperatures)
     hour_count=1
     for x in range(len(hourly_temperatures)):
         temp_normalized = (hourly_temperatures[x] - temp_max) / (temp_min - temp_max)
-        draw.rectangle((x * segment_x_size, temp_normalized * size_y, (x+1) * segment_x_size, size_y + lower_offset), fill=YELLOW)
-        draw.rectangle((x * segment_x_size, temp_normalized * size_y, (x+1) * segment_x_size, temp_normalized * size_y + width), fill=DARK_YELLOW)
+        draw.rectangle((x * segment_x_size, temp_normalized * chart_y, (x+1) * segment_x_size, chart_y + lower), fill=YELLOW)
+        draw.rectangle((x * segment_x_size, temp_normalized * chart_y, (x+1) * segment_x_size, temp_normalized * chart_y + line), fill=DARK_YELLOW)
 
         if x % 4 == 0:
+            # labels in layout coordinates, DrawString zooms them
             DrawString(surf, str(round(hourly_temperatures[x])) + "°C", FONT_SMALL_BOLD,
-                       BLACK, y + temp_normalized * size_y + width - 22).left(x * segment_x_size + 30)
-            new_datetime = datetime.datetime.now() + datetime.timedelta(hours=hour_count)
+                       BLACK, y + temp_normalized * size_y + width - 22).left(x * size_x / len(hourly_temperatures) + 30)
+            new_datetime = current_time() + datetime.timedelta(hours=hour_count)
             DrawString(surf, str(new_datetime.hour).rjust(2, '0') + ":00", FONT_SMALLEST,
-                       BLACK, y + size_y + 14).left(x * segment_x_size + 27)
+                       BLACK, y + size_y + 14).left(x * size_x / len(hourly_temperatures) + 27)
             hour_count = hour_count + 4
 
     logger.debug(f'hourly temperature plot min. temp: {temp_min} max. temp: {temp_max}')
 
     image = pygame.image.fromstring(image.tobytes(), image.size, image.mode)
 
-    x = SURFACE_WIDTH - size_x * 1.07
+    x = SURFACE_WIDTH - chart_x * 1.07
 
-    surf.blit(image, (x, y))
+    surf.blit(image, (x, int(y * ZOOM)))
 
 
 
 def draw_hourly_precipitation_probability(surf, y, size_x, size_y, hourly_precip_prob, width=2, lower_offset=0):
-    image = Image.new("RGBA", (size_x , size_y+width+lower_offset))
+    """
+    :param y: layout coordinates like DrawString and DrawImage, the chart is zoomed here
+    """
+    chart_x, chart_y = int(size_x * ZOOM), int(size_y * ZOOM)
+    line, lower = max(1, int(width * ZOOM)), int(lower_offset * ZOOM)
+
+    image = Image.new("RGBA", (chart_x, chart_y + line + lower))
     draw = ImageDraw.Draw(image)
 
     prec_min = 0
     prec_max = 100
 
-    segment_x_size = size_x / len(hourly_precip_prob)
+    segment_x_size = chart_x / len(hourly_precip_prob)
     for x in range(len(hourly_precip_prob)):
         temp_normalized = (hourly_precip_prob[x] - prec_max) / (prec_min - prec_max)
-        draw.rectangle((x * segment_x_size, temp_normalized * size_y, (x+1) * segment_x_size, size_y + lower_offset), fill=BLUE)
-        draw.rectangle((x * segment_x_size, temp_normalized * size_y, (x+1) * segment_x_size, temp_normalized * size_y + width), fill=DARK_BLUE)
+        draw.rectangle((x * segment_x_size, temp_normalized * chart_y, (x+1) * segment_x_size, chart_y + lower), fill=BLUE)
+        draw.rectangle((x * segment_x_size, temp_normalized * chart_y, (x+1) * segment_x_size, temp_normalized * chart_y + line), fill=DARK_BLUE)
 
         if x % 3 == 0:
             DrawString(surf, str(round(hourly_precip_prob[x])) + "%", FONT_SMALL_BOLD,
-                       BLACK, y + temp_normalized * size_y + width - 22).left(x * segment_x_size + 30)
+                       BLACK, y + temp_normalized * size_y + width - 22).left(x * size_x / len(hourly_precip_prob) + 30)
 
     logger.debug(f'hourly precipitation probabilty plot min. temp: {prec_min} max. probabilty plot: {prec_max}')
 
     image = pygame.image.fromstring(image.tobytes(), image.size, image.mode)
 
-    x = SURFACE_WIDTH - size_x * 1.07
+    x = SURFACE_WIDTH - chart_x * 1.07
 
-    surf.blit(image, (x, y))
+    surf.blit(image, (x, int(y * ZOOM)))
 
 
 class Update(object):
 
     @staticmethod
-    def update_json():
-
-        global THREADS, CONNECTION_ERROR, CONNECTION
-
-        thread = threading.Timer(config["TIMER"]["UPDATE"], Update.update_json)
+    def update_json(chain=True):
+        """
+        :param chain: start the timer for the next update, False for a single extra update
+        """
 
-        thread.start()
+        global CONNECTION_ERROR, CONNECTION, HISTORY_COMPACTED, LATEST_DATA
 
-        THREADS.append(thread)
+        if chain:
+            start_timer(config["TIMER"]["UPDATE"], Update.update_json)
 
         CONNECTION = pygame.time.get_ticks() + 1500  # 1.5 seconds
 
         try:
             logger.info(f'connecting to server: {SERVER}')
 
-            current_datetime = datetime.datetime.now()
+            current_datetime = current_time()
 
-            weather = OpenMeteoApi.get_weather(current_datetime)
+            # a source that fails keeps its last data, freshness tells how old it is
+            data = DataSources.fetch_all(SOURCES, current_datetime, LATEST_DATA)
+            LATEST_DATA = data
 
-            data = {'weather': weather}
+            if 'weather' in data:
+                with open(LOG_PATH + '_latest_weather.json', 'w+') as outputfile:
+                    json.dump(data, outputfile, indent=2, sort_keys=True)
 
-            with open(LOG_PATH + '_latest_weather.json', 'w+') as outputfile:
-                json.dump(data, outputfile, indent=2, sort_keys=True)
+                logger.info('json file saved')
 
-            logger.info('json file saved')
+            if not data['freshness']['weather']['ok']:
+                raise AsyncFetcher.FetchError(data['freshness']['weather']['error'])
+
+            if HISTORY:
+                HISTORY.append(SITE, data['weather'])
+
+                # compact once a day, the store is append-only otherwise
+                if time.time() - HISTORY_COMPACTED > 86400:
+                    HISTORY.compact()
+                    HISTORY_COMPACTED = time.time()
 
             CONNECTION_ERROR = False
 
-        except (requests.HTTPError, requests.ConnectionError) as update_ex:
+        except AsyncFetcher.FetchError as update_ex:
 
             CONNECTION_ERROR = True
 
             logger.warning(f'Connection ERROR: {update_ex}')
+            logger.warning(f'api circuit: {OpenMeteoApi.BREAKER.state()}')
 
-    @staticmethod
-    def read_json():
+        publish_status()
 
-        global THREADS, JSON_DATA_WEATHER, REFRESH_ERROR, READING
-
-        thread = threading.Timer(config["TIMER"]["RELOAD"], Update.read_json)
+    @staticmethod
+    def read_json(chain=True):
 
-        thread.start()
+        global JSON_DATA_WEATHER, JSON_DATA_AIR, REFRESH_ERROR, READING
 
-        THREADS.append(thread)
+        if chain:
+            start_timer(config["TIMER"]["RELOAD"], Update.read_json)
 
         READING = pygame.time.get_ticks() + 1500  # 1.5 seconds
 
@@ -584,6 +807,7 @@ class Update(object):
             logger.info(f'{new_json_data}')
 
             JSON_DATA_WEATHER = new_json_data['weather']
+            JSON_DATA_AIR = new_json_data.get('air_quality', {})
 
             REFRESH_ERROR = False
 
@@ -595,12 +819,15 @@ class Update(object):
 
         Update.icon_path()
 
+        # reloads of the settings redraw at once, only the timers pause
+        if chain and VIRTUAL_TIME is None:
+            pygame.time.delay(1500)
+
     @staticmethod
     def icon_path():
 
         global WEATHERICON, FORECASTICON_DAYS, PRECIPTYPE, PRECIPCOLOR, UPDATING
 
-        icon_extension = '.png'
         day_or_night = 'd'
 
         updated_list = []
@@ -615,12 +842,12 @@ class Update(object):
 
         # Current weather:
         df_sun = theme["DATE_FORMAT"]["SUNRISE_SUNSET"]
-        new_datetime = datetime.datetime.now()
+        new_datetime = current_time()
 
         sunrise = format_datetime(JSON_DATA_WEATHER['current_sunrise'], df_sun)
         sunset = format_datetime(JSON_DATA_WEATHER['current_sunset'], df_sun)
 
-        today_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        today_date = current_time().strftime("%Y-%m-%d")
         sunrise_with_date = today_date + " " + sunrise
         sunset_with_date = today_date + " " + sunset
 
@@ -633,7 +860,7 @@ class Update(object):
         day_or_night = 'd'
         if sunset_time < new_datetime or new_datetime < sunrise_time:
             day_or_night = 'n'
-        if os.path.isfile(os.path.join(ICON_PATH, current_icon + day_or_night + icon_extension)):
+        if images.variant(current_icon, day_or_night):
             logger.debug(f'TRUE : {current_icon}')
             updated_list.append(current_icon + day_or_night)
         else:
@@ -642,13 +869,16 @@ class Update(object):
 
 
         for icon in forecast_icons:
-            if os.path.isfile(os.path.join(ICON_PATH, icon + 'd' + icon_extension)):
+            if images.variant(icon, 'd'):
                 logger.debug(f'TRUE : {icon}')
                 updated_list.append(icon + 'd')
             else:
                 logger.warning(f'FALSE : {icon}')
                 updated_list.append('unknown')
 
+        # only the icons of the current forecast are cut out of the atlas
+        images.prepare(updated_list)
+
         WEATHERICON = updated_list[0]
         FORECASTICON_DAYS = [updated_list[1], updated_list[2], updated_list[3], updated_list[4], updated_list[5],
                              updated_list[6]]
@@ -677,9 +907,35 @@ class Update(object):
     @staticmethod
     def create_surface():
 
-        global weather_surf, UPDATING
+        global weather_surf, time_background, UPDATING
+
+        if LOW_MEMORY:
+            with SURFACE_LOCK:
+                if time_background.get_size() != time_rect().size:
+                    # DATE_SIZE or CLOCK_SIZE changed, the whole clock region has to be restored
+                    time_background = create_layer(time_rect().size)
+                PaletteLayer.draw(weather_surf, Update.draw_weather)
+                time_background.blit(weather_surf, (0, 0), time_rect())
+        else:
+            new_surf = pygame.Surface((SURFACE_WIDTH, SURFACE_HEIGHT))
+            Update.draw_weather(new_surf)
+
+            weather_surf = new_surf
+
+        logger.info(f'memory: rss {Metrics.rss_kb()} kB, peak {Metrics.peak_rss_kb()} kB')
+
+        # remove the ended timer and threads
+        global THREADS
+        THREADS = [t for t in THREADS if t.is_alive()]
+        logging.info(f'threads cleaned: {len(THREADS)} left in the queue')
+
+        UPDATING = pygame.time.get_ticks() + 1500  # 1.5 seconds
+
+        return weather_surf
+
+    @staticmethod
+    def draw_weather(new_surf):
 
-        new_surf = pygame.Surface((SURFACE_WIDTH, SURFACE_HEIGHT))
         new_surf.fill(BACKGROUND)
 
         df_forecast = theme["DATE_FORMAT"]["FORECAST_DAY"]
@@ -701,7 +957,7 @@ class Update(object):
 
         current_uvi = JSON_DATA_WEATHER['uv_index_max']
 
-        DrawImage(new_surf, images[WEATHERICON], size=120).draw_position(pos=(30, 80))
+        DrawImage(new_surf, images[WEATHERICON], size=LARGEST_ICON).draw_position(pos=(30, 80))
 
         temp_out_unit = "°C" if METRIC else "°F"
         temp_out = str(round(JSON_DATA_WEATHER["current_temperature"]))
@@ -712,6 +968,13 @@ class Update(object):
         DrawString(new_surf, temp_out_unit, FONT_BIG, BLACK, 101).right(530)
         DrawString(new_surf, apparent_temperature_string, FONT_MEDIUM, BLACK, 155).right(530)
 
+        # air quality below the feels like temperature, the icon left of the value
+        if JSON_DATA_AIR.get('aqi') is not None:
+            aqi_string = str(round(JSON_DATA_AIR['aqi']))
+            aqi_width = FONT_MEDIUM.size(aqi_string)[0] / ZOOM
+            DrawString(new_surf, aqi_string, FONT_MEDIUM, BLACK, 183).right(530)
+            DrawImage(new_surf, images['aqi'], 184, size=26).right(530 + aqi_width + 6)
+
         # Draw daily forcast
         for i, day in enumerate(FORECASTICON_DAYS):
             day_ts = format_date(JSON_DATA_WEATHER['daily_dates'][i], df_forecast)
@@ -743,13 +1006,10 @@ class Update(object):
                            105 + 44 * y).center(1, 0, -225 * x + 90 + 225)
                 DrawImage(new_surf, grid_data[y * 2 + x][0], 95 + 44 * y, size=40).right(225 * x + 150)
 
-        draw_hourly_temp(new_surf, int(230 * ZOOM), int(710 * ZOOM), int(45 * ZOOM),
-                         JSON_DATA_WEATHER['hourly_temperatures'])
-
-        draw_hourly_precipitation_probability(new_surf, int(325 * ZOOM), int(710 * ZOOM), int(15 * ZOOM),
-                            JSON_DATA_WEATHER['hourly_precipitation_probability'])
+        draw_hourly_temp(new_surf, 230, 710, 45, JSON_DATA_WEATHER['hourly_temperatures'])
 
-        weather_surf = new_surf
+        draw_hourly_precipitation_probability(new_surf, 325, 710, 15,
+                                              JSON_DATA_WEATHER['hourly_precipitation_probability'])
 
         logger.info(f'temp out: {temp_out}')
         logger.info(f'icon: {WEATHERICON}')
@@ -760,16 +1020,6 @@ class Update(object):
         logger.info(f'sunrise: {sunrise} ; sunset {sunset}')
         logger.info(f'WindSpeed: {wind_speed_string}')
 
-        # remove the ended timer and threads
-        global THREADS
-        THREADS = [t for t in THREADS if t.is_alive()]
-        logging.info(f'threads cleaned: {len(THREADS)} left in the queue')
-
-        pygame.time.delay(1500)
-        UPDATING = pygame.time.get_ticks() + 1500  # 1.5 seconds
-
-        return weather_surf
-
     @staticmethod
     def run():
         Update.update_json()
@@ -789,8 +1039,11 @@ def get_brightness():
     return 25 if current_time >= 20 or current_time <= 5 else 100
 
 
-def draw_time_layer():
-    current_datetime = datetime.datetime.now()
+def shown_time():
+    """
+    :return: the time the clock shows, rounded up to the next 5 minute mark
+    """
+    current_datetime = current_time()
 
     # Calculate how many minutes to add to round up to the next 5-minute mark
     minute = current_datetime.minute
@@ -800,22 +1053,40 @@ def draw_time_layer():
         add_minutes = 5 - remainder
         current_datetime = current_datetime + datetime.timedelta(minutes=add_minutes)
 
+    return current_datetime
+
+
+def draw_time_layer(surf):
+    current_datetime = shown_time()
+
     date_day_string = current_datetime.strftime(theme["DATE_FORMAT"]["DATE"])
     date_time_string = current_datetime.strftime(theme["DATE_FORMAT"]["TIME"])
 
     logger.debug(f'Day: {date_day_string}')
     logger.debug(f'Time: {date_time_string}')
 
-    DrawString(time_surf, date_day_string, DATE_FONT, MAIN_FONT, 68).center(1, 0)
-    DrawString(time_surf, date_time_string, CLOCK_FONT, MAIN_FONT, 0).center(1, 0)
+    DrawString(surf, date_day_string, DATE_FONT, MAIN_FONT, 68).center(1, 0)
+    DrawString(surf, date_time_string, CLOCK_FONT, MAIN_FONT, 0).center(1, 0)
 
 
 def draw_moon_layer(surf, x, y, size):
     # based on @miyaichi's fork -> great idea :)
-    _size = 1000
     dt = datetime.datetime.strptime(JSON_DATA_WEATHER['daily_dates'][0], "%Y-%m-%d")
     moon_age = (((dt.year - 11) % 19) * 11 + [0, 2, 0, 2, 2, 4, 5, 6, 7, 8, 9, 10][dt.month - 1] + dt.day) % 30
 
+    # the moon only changes once a day, no need to draw it every reload
+    key = (moon_age, size, MOONLIGHT, MOONDARK)
+    if key not in MOON_CACHE:
+        MOON_CACHE.clear()
+        MOON_CACHE[key] = create_moon(x, size, moon_age)
+
+    surf.blit(MOON_CACHE[key], (x, y))
+
+
+def create_moon(x, size, moon_age):
+    # drawn oversized and scaled down for smooth edges, 4 times is enough and far less memory than 1000px
+    _size = size * 4 if LOW_MEMORY else 1000
+
     image = Image.new("RGBA", (_size + 2, _size + 2))
     draw = ImageDraw.Draw(image)
 
@@ -848,12 +1119,14 @@ def draw_moon_layer(surf, x, y, size):
     logger.debug(f'moon phase age: {moon_age} percentage: {round(100 - (sum_length / sum_x) * 100, 1)}')
 
     image = image.resize((size, size), Image.LANCZOS if AA else Image.BILINEAR)
-    image = pygame.image.fromstring(image.tobytes(), image.size, image.mode)
-
-    surf.blit(image, (x, y))
+    return pygame.image.fromstring(image.tobytes(), image.size, image.mode)
 
 
 def create_scaled_surf(surf, aa=False):
+    if surf.get_size() == (SURFACE_WIDTH, SURFACE_HEIGHT):
+        # scaling to the same size would only allocate a copy
+        return surf
+
     if aa:
         scaled_surf = pygame.transform.smoothscale(surf, (SURFACE_WIDTH, SURFACE_HEIGHT))
     else:
@@ -862,37 +1135,296 @@ def create_scaled_surf(surf, aa=False):
     return scaled_surf
 
 
+def surface_image(surf):
+    return Image.frombytes('RGB', surf.get_size(), pygame.image.tostring(surf, 'RGB'))
+
+
+def encode_frame(image, settings):
+    """
+    :param image: the frame from surface_image(), converted once for the gate, the frame and its bands
+    """
+    # smallest good looking encoding within the byte budget, every byte costs the frame WiFi time
+    return FrameEncoder.encode(image, settings['BYTE_BUDGET'],
+                               time_budget=settings['TIME_BUDGET'],
+                               formats=settings['FORMATS'],
+                               min_quality=settings['MIN_QUALITY'],
+                               max_quality=settings['MAX_QUALITY'])
+
+
+def encode_bands(image, info):
+    # the same frame again as strips, for devices that can not hold the whole image
+    return FrameEncoder.encode_bands(image, config['BANDS']['HEIGHT'], info)
+
+
+PUBLISH_GATE = None
+
+if config['PUBLISH_GATE']['ENABLED']:
+    PUBLISH_GATE = PublishGate(config['PUBLISH_GATE']['TEMPERATURE_DELTA'], config['PUBLISH_GATE']['CHANGED_PIXELS'])
+
+
+def frame_inputs():
+    # the time the clock shows, not the wall clock, it is allowed to be up to one slot old
+    shown = shown_time()
+    slot = (shown.hour * 3600 + shown.minute * 60) // config['PUBLISH_GATE']['CLOCK_SLOT']
+    return {
+        'clock_slot': f'{shown.date()} {slot}',
+        'temperatures': {key: JSON_DATA_WEATHER.get(key) for key in ('current_temperature', 'apparent_temperature')},
+    }
+
+
+def publish(surf):
+    """
+    encodes and publishes the frame if it differs enough from the last published one,
+    every published frame makes the e-ink frames do a full refresh
+
+    :return: True if the frame was published
+    """
+    image = surface_image(surf)
+
+    if PUBLISH_GATE:
+        inputs = frame_inputs()
+        significant, reason = PUBLISH_GATE.significant(inputs, image)
+        if not significant:
+            Metrics.count('publications_skipped')
+            publish_status()
+            logger.info(f'frame not published: {reason}, '
+                        f'{Metrics.counters()["publications_skipped"]} skipped since start')
+            return False
+        PUBLISH_GATE.published(inputs, image)
+        logger.info(f'frame published: {reason}')
+
+    data, info = encode_frame(image, config['ENCODER'])
+    Webserver.publish_frame(data, info)
+    if config['BANDS']['ENABLED']:
+        Webserver.publish_bands(encode_bands(image, info))
+
+    Metrics.count('publications')
+    publish_status()
+    return True
+
+
+def publish_status():
+    # /status may be served by another process, it reads the state of the app from a file
+    Webserver.publish_status({'counters': Metrics.counters(),
+                              'api': OpenMeteoApi.BREAKER.state(),
+                              'air_quality_api': OpenMeteoApi.AIR_QUALITY_BREAKER.state()})
+
+
+def snapshot():
+    return {
+        'weather': JSON_DATA_WEATHER,
+        'icon': WEATHERICON,
+        'forecast_icons': FORECASTICON_DAYS,
+        'air_quality': JSON_DATA_AIR,
+        'locale': config['LOCALE'],
+        # the workers were forked at start, settings that can be reloaded since then are passed along
+        'theme': theme,
+        'encoder': config['ENCODER'],
+        'bands': config['BANDS'],
+    }
+
+
+def render_profile(profile, forecast):
+    """
+    renders and publishes one display profile, runs in a RenderPool worker process
+
+    :param profile: entry of config['PROFILES'] with NAME, WIDTH, HEIGHT and optional ZOOM, THEME, LOCALE, ENCODER
+    :param forecast: forecast and icons from snapshot() of the main process
+    """
+    global JSON_DATA_WEATHER, JSON_DATA_AIR, WEATHERICON, FORECASTICON_DAYS, METRIC
+
+    start = time.perf_counter()
+
+    JSON_DATA_WEATHER = forecast['weather']
+    JSON_DATA_AIR = forecast['air_quality']
+    WEATHERICON = forecast['icon']
+    FORECASTICON_DAYS = forecast['forecast_icons']
+
+    # the worker is a copy of the main process, changing its config does not leak back
+    config['LOCALE'] = dict(forecast['locale'], **profile.get('LOCALE', {}))
+    config['BANDS'] = forecast['bands']
+    METRIC = config['LOCALE']['METRIC']
+    locale.setlocale(locale.LC_ALL, (config['LOCALE']['ISO'], 'UTF-8'))
+
+    apply_display(profile['WIDTH'], profile['HEIGHT'], profile_zoom(profile))
+    apply_theme(load_theme(profile['THEME']) if 'THEME' in profile else forecast['theme'])
+
+    surf = pygame.Surface((SURFACE_WIDTH, SURFACE_HEIGHT))
+    Update.draw_weather(surf)
+    draw_time_layer(surf)
+    render_time = round(time.perf_counter() - start, 3)
+
+    image = surface_image(surf)
+    data, info = encode_frame(image, profile.get('ENCODER', forecast['encoder']))
+    Webserver.publish_frame(data, dict(info, render_time=render_time), profile['NAME'])
+    if config['BANDS']['ENABLED']:
+        Webserver.publish_bands(encode_bands(image, info), profile['NAME'])
+
+    return {'name': profile['NAME'], 'render_time': render_time, 'encode_time': info['encode_time'],
+            'size': info['size']}
+
+
+def draw_time_region(surf):
+    surf.blit(time_background, (0, 0))
+    draw_time_layer(surf)
+
+
+def compose_frame():
+    if LOW_MEMORY:
+        with SURFACE_LOCK:
+            # restore what is behind the clock and redraw only that region
+            PaletteLayer.draw(display_surf, draw_time_region, time_rect())
+
+        return display_surf
+
+    # fill the actual main surface and blit the image/weather layer
+    display_surf.fill(BACKGROUND)
+    display_surf.blit(weather_surf, (0, 0))
+
+    # fill the dynamic layer, make it transparent and use draw functions that write to that surface
+    dynamic_surf.fill(BACKGROUND)
+    dynamic_surf.set_colorkey(BACKGROUND)
+
+    # finally take the dynamic surface and blit it to the main surface
+    display_surf.blit(dynamic_surf, (0, 0))
+
+    # now do the same for the time layer so it did not interfere with the other layers
+    # fill the layer and make it transparent as well
+    time_surf.fill(BACKGROUND)
+    time_surf.set_colorkey(BACKGROUND)
+
+    # draw the time to the main layer
+    draw_time_layer(time_surf)
+    display_surf.blit(time_surf, (0, 0))
+
+    return display_surf
+
+
+# config keys that are only read at startup
+RESTART_KEYS = ('ENV', 'DISPLAY', 'SERVER_MODE', 'SERVER_Port', 'SERVER_ASYNC', 'SERVER_PROCESS', 'SERVER_MAX_CLIENTS',
+                'SERVER_BACKLOG', 'SERVER_SHARED_FRAME_SIZE', 'RENDER', 'PROFILES', 'PUBLISH', 'HISTORY',
+                'FORECAST_CACHE', 'FETCH', 'PUBLISH_GATE')
+# config keys that change what is fetched
+FETCH_KEYS = ('OPENMETRO_WEATHER_LAT', 'OPENMETRO_WEATHER_LONG', 'OPENMETRO_TIMEZONE', 'OPENMETRO_URL',
+              'OPENMETRO_AIR_QUALITY_URL', 'AIR_QUALITY')
+
+CONFIG_FILE = os.path.join(PATH, 'config.json')
+
+WATCHER = None
+RELOAD_LOCK = threading.Lock()
+
+
+def reload_settings(changed_files, detected):
+    """
+    applies changes of config.json and the theme file while running, only what changed is redone:
+    colors and fonts redraw the weather, the locale redraws it too and a new location fetches once
+
+    :param changed_files: the files reported by the WATCHER
+    :param detected: perf_counter() when the change was noticed
+    """
+    global SERVER, METRIC, SITE, SOURCES
+
+    with RELOAD_LOCK:
+        try:
+            with open(CONFIG_FILE) as config_file:
+                new_config = json.load(config_file)
+            new_theme = load_theme(new_config['THEME'])
+        except (OSError, ValueError, KeyError) as reload_ex:
+            # most likely still being written, it is read again on the next poll
+            logger.warning(f'settings not reloaded: {reload_ex}')
+            for path in changed_files:
+                WATCHER.forget(path)
+            return
+
+        config_changes = ConfigWatcher.changed_keys(config, new_config)
+        theme_changes = ConfigWatcher.changed_keys(theme, new_theme)
+
+        if not config_changes and not theme_changes:
+            return
+
+        logger.info(f'settings changed: config {sorted(config_changes)} theme {sorted(theme_changes)}')
+
+        restart = config_changes.intersection(RESTART_KEYS)
+        if restart:
+            logger.warning(f'restart needed to apply {sorted(restart)}')
+
+        # some of them are read while running, half applied they would not fit to what was set up at start
+        for key in RESTART_KEYS:
+            if key in config:
+                new_config[key] = config[key]
+
+        # in place, Webserver and OpenMeteoApi read the same file into their own dicts
+        for module_config in (config, Webserver.config, OpenMeteoApi.config):
+            module_config.update(json.loads(json.dumps(new_config)))
+
+        if 'THEME' in config_changes:
+            WATCHER.watch([CONFIG_FILE, os.path.join(PATH, config['THEME'])])
+
+        if theme_changes:
+            if 'COLOR' in theme_changes:
+                MOON_CACHE.clear()
+                if PALETTE:
+                    logger.warning('restart needed to apply the colors to the palette surfaces')
+            # fonts of unchanged sizes come from the FONT_CACHE
+            apply_theme(new_theme)
+
+        if 'LOCALE' in config_changes:
+            METRIC = config['LOCALE']['METRIC']
+            locale.setlocale(locale.LC_ALL, (config['LOCALE']['ISO'], 'UTF-8'))
+
+        if config_changes.intersection(FETCH_KEYS):
+            SERVER = config['OPENMETRO_URL']
+            SITE = f'{config["OPENMETRO_WEATHER_LAT"]},{config["OPENMETRO_WEATHER_LONG"]}'
+            SOURCES = create_sources()
+            # a single update outside of the timers, which keep their schedule
+            Update.update_json(chain=False)
+            Update.read_json(chain=False)
+        elif theme_changes or 'LOCALE' in config_changes:
+            Update.create_surface()
+
+        logger.info(f'settings applied in {round((time.perf_counter() - detected) * 1000)}ms')
+
+
+def check_settings():
+    changed_files = WATCHER.changed()
+    if changed_files:
+        threading.Thread(target=reload_settings, args=(changed_files, time.perf_counter()), daemon=True).start()
+
+
 def loop():
+    global WATCHER
+
     Update.run()
 
+    if config['WATCH_CONFIG']:
+        WATCHER = ConfigWatcher.ConfigWatcher([CONFIG_FILE, os.path.join(PATH, config['THEME'])])
+
     running = True
 
     while running:
-        now = datetime.datetime.now()
-
-        # Only update when minute is multiple of 5 and second is 0
-        if not config["SERVER_MODE"] or now.minute % 2 == 0 and now.second < 30:
-            tft_surf.fill(BACKGROUND)
+        if WATCHER:
+            check_settings()
 
-            # fill the actual main surface and blit the image/weather layer
-            display_surf.fill(BACKGROUND)
-            display_surf.blit(weather_surf, (0, 0))
+        # Only update at the start of each publish interval, devices are told to wake after that
+        if not config["SERVER_MODE"] or SCHEDULE.publish_due():
+            # in LOW_MEMORY mode the weather is redrawn straight into display_surf by the timer threads,
+            # the frame is only complete while they are kept out until it is shown and published
+            with SURFACE_LOCK:
+                tft_surf.fill(BACKGROUND)
 
-            # fill the dynamic layer, make it transparent and use draw functions that write to that surface
-            dynamic_surf.fill(BACKGROUND)
-            dynamic_surf.set_colorkey(BACKGROUND)
+                compose_frame()
 
-            # finally take the dynamic surface and blit it to the main surface
-            display_surf.blit(dynamic_surf, (0, 0))
+                if FRAMEBUFFER:
+                    # straight into the device memory, only the rows that changed
+                    FRAMEBUFFER.show(create_scaled_surf(display_surf, aa=AA), FIT_SCREEN)
+                else:
+                    # finally take the main surface and blit it to the tft surface
+                    tft_surf.blit(create_scaled_surf(display_surf, aa=AA), FIT_SCREEN)
 
-            # now do the same for the time layer so it did not interfere with the other layers
-            # fill the layer and make it transparent as well
-            time_surf.fill(BACKGROUND)
-            time_surf.set_colorkey(BACKGROUND)
+                    # update the display with all surfaces merged into the main one
+                    pygame.display.update()
 
-            # draw the time to the main layer
-            draw_time_layer()
-            display_surf.blit(time_surf, (0, 0))
+                published = config["SERVER_MODE"] and publish(display_surf)
 
             for event in pygame.event.get():
 
@@ -914,23 +1446,13 @@ def loop():
                         pygame.image.save(display_surf, 'screenshot.png')
                         logger.info('Screenshot created')
 
-            # finally take the main surface and blit it to the tft surface
-            tft_surf.blit(create_scaled_surf(display_surf, aa=AA), FIT_SCREEN)
-
-            # update the display with all surfaces merged into the main one
-            pygame.display.update()
-
             # Sleep a bit to reduce CPU usage
             if config["SERVER_MODE"]:
-                pygame.image.save(display_surf, 'temp_screenshot.png')
-
-                # Open the PNG and convert to JPG with Pillow
-                img = Image.open('temp_screenshot.png')
-                img = img.convert('RGB')  # JPG doesn't support alpha channel
-                img.save('screenshot.jpg', 'JPEG')
+                # the other display profiles render in parallel worker processes
+                if published and RENDER_POOL:
+                    RENDER_POOL.submit(snapshot(), config['PROFILES'])
 
-                logger.info('Screenshot created')
-                time.sleep(30)
+                time.sleep(SCHEDULE.window)
 
         clock.tick(1)
 
@@ -941,6 +1463,11 @@ if __name__ == '__main__':
 
     try:
         images = image_factory(ICON_PATH)
+
+        if config['SERVER_MODE'] and config['PROFILES']:
+            # forked after fonts and icons are loaded, so all workers share them
+            RENDER_POOL = RenderPool(render_profile, config['RENDER']['PROCESSES'] or None)
+
         loop()
 
     except KeyboardInterrupt:
@@ -1,28 +1,280 @@
+import logging
 import sys
 import flask
 import os
 import json
+import time
 
-from flask import send_file, abort
+from flask import send_file, abort, request
 from waitress import serve
+from RefreshSchedule import RefreshSchedule
+from SharedFrame import SharedFrame
+
+logger = logging.getLogger(__package__)
 
 app = flask.Flask(__name__)
 
 IMAGE_FILENAME = 'screenshot.jpg'  # Change to your image filename
+FRAME_INFO = 'screenshot.json'  # written next to the image by publish_frame()
+STATUS_FILE = 'status.json'  # state of the app for /status, written by publish_status()
 PATH = sys.path[0] + "/"
 
 
 with open(os.path.join(PATH, 'config.json')) as f:
     config = json.load(f)
 
+PROFILES = [profile['NAME'] for profile in config['PROFILES']]
+
+schedule = RefreshSchedule(config['PUBLISH']['INTERVAL'], config['PUBLISH']['WINDOW'],
+                           config['PUBLISH']['SETTLE'], config['PUBLISH']['JITTER'])
+
+# profile name (None for the main frame) -> SharedFrame, set by open_shared() if the server runs in its own process
+SHARED = None
+
+
+def write_atomic(filename, data):
+    # readers either see the old or the new file, never a partly written one
+    with open(filename + '.tmp', 'wb') as output_file:
+        output_file.write(data)
+    os.replace(filename + '.tmp', filename)
+
+
+def frame_prefix(profile=None):
+    return 'screenshot' if profile is None else 'screenshot_' + profile
+
+
+def frame_info_filename(profile=None):
+    return FRAME_INFO if profile is None else frame_prefix(profile) + '.json'
+
+
+def open_shared():
+    """
+    creates the shared memory frames, must be called before the server process and the render workers are forked
+    """
+    global SHARED
+
+    SHARED = {profile: SharedFrame(f'weatherpi_{config["SERVER_Port"]}_{frame_prefix(profile)}',
+                                   config['SERVER_SHARED_FRAME_SIZE'], create=True)
+              for profile in [None] + PROFILES}
+
+
+def close_shared():
+    global SHARED
+
+    if SHARED:
+        for shared_frame in SHARED.values():
+            shared_frame.close()
+    SHARED = None
+
+
+def publish_frame(data, info, profile=None):
+    """
+    :param data: the encoded image
+    :param info: the dict returned by FrameEncoder.encode()
+    :param profile: name of the render profile, None for the main frame
+    """
+    prefix = frame_prefix(profile)
+    info = dict(info, filename=prefix + info['extension'], timestamp=time.time())
+    write_atomic(info['filename'], data)
+    write_atomic(frame_info_filename(profile), json.dumps(info, indent=2).encode('utf-8'))
+
+    if SHARED:
+        try:
+            SHARED[profile].write(data, json.dumps(info).encode('utf-8'))
+        except ValueError as shared_ex:
+            # the server keeps the previous frame, SERVER_SHARED_FRAME_SIZE has to be raised
+            logger.warning(f'frame not shared: {shared_ex}')
+
+
+def publish_status(status):
+    """
+    :param status: dict with the state of the app, shown by /status
+    """
+    write_atomic(STATUS_FILE, json.dumps(dict(status, updated=time.time())).encode('utf-8'))
+
+
+def read_status():
+    try:
+        with open(STATUS_FILE) as status_file:
+            return json.load(status_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def bands_filename(profile=None):
+    return frame_prefix(profile) + '_bands.bin'
+
+
+def publish_bands(bands, profile=None):
+    """
+    writes the bands of a frame as one file, a json index line followed by the band data,
+    so the index always describes the bands next to it
+
+    :param bands: the list returned by FrameEncoder.encode_bands()
+    """
+    index = {'frame': int(time.time() * 1000), 'timestamp': time.time(), 'mimetype': bands[0][1]['mimetype'],
+             'bands': []}
+    offset = 0
+    for data, info in bands:
+        index['bands'].append(dict(info, offset=offset))
+        offset += len(data)
+
+    header = json.dumps(index).encode('utf-8')
+    write_atomic(bands_filename(profile), header + b'\n' + b''.join(data for data, _ in bands))
+
+
+def bands_version(profile=None):
+    try:
+        return os.stat(bands_filename(profile)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def read_bands(profile=None):
+    """
+    :return: (data, index) with the data of all bands in a row, offsets and sizes are in the index, or (None, None)
+    """
+    try:
+        with open(bands_filename(profile), 'rb') as bands_file:
+            index = json.loads(bands_file.readline())
+            data = bands_file.read()
+    except (OSError, ValueError):
+        return None, None
+
+    return data, index
+
+
+def frame_version(profile=None):
+    """
+    :return: a value that changes with every published frame, None if there is none
+    """
+    if SHARED:
+        return SHARED[profile].generation or None
+
+    try:
+        # the info file is written after the image, so its change means a complete new frame
+        if profile is None and not os.path.exists(FRAME_INFO):
+            return os.stat(IMAGE_FILENAME).st_mtime_ns
+        return os.stat(frame_info_filename(profile)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def frame_info(profile=None):
+    """
+    :return: the info of the published frame, frames saved before the encoder existed are plain jpegs
+    """
+    if SHARED:
+        return read_frame(profile)[1]
+
+    try:
+        with open(frame_info_filename(profile)) as info_file:
+            return json.load(info_file)
+    except (OSError, ValueError):
+        pass
+
+    if profile is not None:
+        return None
+
+    try:
+        return {'filename': IMAGE_FILENAME, 'mimetype': 'image/jpeg', 'timestamp': os.stat(IMAGE_FILENAME).st_mtime}
+    except OSError:
+        return None
+
+
+def read_frame(profile=None):
+    """
+    :return: (data, info) of the published frame or (None, None)
+    """
+    if SHARED:
+        # frame and info from the same generation, never a torn file
+        data, info = SHARED[profile].read()
+        return data, info and json.loads(info)
+
+    info = frame_info(profile)
+    if info is None:
+        return None, None
+    try:
+        with open(info['filename'], 'rb') as image_file:
+            return image_file.read(), info
+    except OSError:
+        return None, None
+
+
+def device_id():
+    # frames can identify themselves with ?device=..., otherwise the address is used
+    return request.args.get('device') or request.remote_addr
+
+
 @app.route('/')
-def serve_image():
-    if os.path.exists(IMAGE_FILENAME):
-        return send_file(IMAGE_FILENAME, mimetype='image/jpeg')
+@app.route('/profile/<name>')
+def serve_image(name=None):
+    if name is not None and name not in PROFILES:
+        abort(404)
+
+    if SHARED:
+        data, info = read_frame(name)
+        if data is None:
+            abort(404)
+        response = flask.Response(data, mimetype=info['mimetype'])
+        response.headers.update(schedule.headers(device_id(), info['timestamp']))
+        # single byte ranges, a device can download the frame in pieces, werkzeug needs the length for them
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+    info = frame_info(name)
+    if info is not None and os.path.exists(info['filename']):
+        # send_file resolves relative paths against the app folder, the frames are written to the working directory
+        response = send_file(os.path.abspath(info['filename']), mimetype=info['mimetype'])
+        response.headers.update(schedule.headers(device_id(), info['timestamp']))
+        return response
     else:
         abort(404)
 
+
+@app.route('/bands')
+@app.route('/profile/<name>/bands')
+def serve_bands(name=None):
+    if name is not None and name not in PROFILES:
+        abort(404)
+
+    _, index = read_bands(name)
+    if index is None:
+        abort(404)
+    return flask.jsonify(index)
+
+
+@app.route('/band/<int:number>')
+@app.route('/profile/<name>/band/<int:number>')
+def serve_band(number, name=None):
+    if name is not None and name not in PROFILES:
+        abort(404)
+
+    data, index = read_bands(name)
+    if data is None or number >= len(index['bands']):
+        abort(404)
+
+    # ?frame= from the index, a band of a newer frame would not fit to the bands already shown
+    frame = request.args.get('frame', type=int)
+    if frame is not None and frame != index['frame']:
+        abort(409)
+
+    band = index['bands'][number]
+    band_data = data[band['offset']:band['offset'] + band['size']]
+    response = flask.Response(band_data, mimetype=index['mimetype'])
+    response.headers.update(schedule.headers(device_id(), index['timestamp']))
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(band_data))
+
+
+@app.route('/status')
+def serve_status():
+    info = frame_info()
+    status = schedule.hint(device_id(), info and info['timestamp'])
+    status['encoding'] = info
+    status['app'] = read_status()
+    return flask.jsonify(status)
+
+
 def run_server():
     print('Server initialized')
     print('Server running on http://localhost:' + str(config['SERVER_Port']))
-    serve(app, host='0.0.0.0', port=config['SERVER_Port'])
\ No newline at end of file
+    serve(app, host='0.0.0.0', port=config['SERVER_Port'])
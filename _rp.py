@@ -0,0 +1,5 @@
+import os, threading, time
+os.environ['SDL_VIDEODRIVER']='dummy'
+import WeatherPiEInk as app
+pool = app.RenderPool(app.render_profile, 2)
+t=threading.Thread(target=pool.close, daemon=True); t.start(); t.join(10); print('closed' if not t.is_alive() else 'HANG')
@@ -0,0 +1,25 @@
+import threading
+
+import pytest
+
+# tests is a package, so pytest puts the repository root first on sys.path, where the modules find config.json
+import OpenMeteoStub
+
+
+@pytest.fixture
+def stub():
+    """
+    the Open-Meteo stub on a free port, without faults
+    """
+    server = OpenMeteoStub.create_stub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    OpenMeteoStub.FAULTS.update(delay=0, stall_rate=0, error_rate=0, truncate_rate=0, drop_rate=0)
+    OpenMeteoStub.REQUESTS = 0
+
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+
+    OpenMeteoStub.FAULTS.update(delay=0, stall_rate=0, error_rate=0, truncate_rate=0, drop_rate=0)
+    server.shutdown()
+    server.server_close()
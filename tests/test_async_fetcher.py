@@ -0,0 +1,92 @@
+import datetime
+import time
+
+import pytest
+
+import AsyncFetcher
+import OpenMeteoApi
+import OpenMeteoStub
+
+
+def forecast_url(stub):
+    today = datetime.date.today()
+    return (f'{stub}/v1/forecast?latitude=48&longitude=13&start_date={today}'
+            f'&end_date={today + datetime.timedelta(days=7)}')
+
+
+def test_valid_forecast(stub):
+    payload = AsyncFetcher.fetch_json(forecast_url(stub), validate=OpenMeteoApi.validate_forecast)
+
+    assert len(payload['daily']['time']) == 8
+    assert OpenMeteoStub.REQUESTS == 1
+
+
+def test_stall_ends_at_read_timeout(stub):
+    OpenMeteoStub.FAULTS['stall_rate'] = 1
+
+    start = time.perf_counter()
+    with pytest.raises(AsyncFetcher.FetchError, match='read timeout'):
+        AsyncFetcher.fetch_json(forecast_url(stub), connect_timeout=1, read_timeout=0.5, hedge_after=5)
+
+    assert time.perf_counter() - start < 1.5
+
+
+def test_slow_response_is_hedged(stub):
+    OpenMeteoStub.FAULTS['delay'] = 0.6
+
+    payload = AsyncFetcher.fetch_json(forecast_url(stub), read_timeout=5, hedge_after=0.2,
+                                      validate=OpenMeteoApi.validate_forecast)
+
+    assert 'daily' in payload
+    assert OpenMeteoStub.REQUESTS == 2
+
+
+def test_truncated_body(stub):
+    OpenMeteoStub.FAULTS['truncate_rate'] = 1
+
+    with pytest.raises(AsyncFetcher.FetchError, match='ended early'):
+        AsyncFetcher.fetch_json(forecast_url(stub), read_timeout=2, hedge_after=5)
+
+
+def test_dropped_section(stub):
+    OpenMeteoStub.FAULTS['drop_rate'] = 1
+
+    with pytest.raises(AsyncFetcher.FetchError):
+        AsyncFetcher.fetch_json(forecast_url(stub), read_timeout=2, hedge_after=5,
+                                validate=OpenMeteoApi.validate_forecast)
+
+
+def test_breaker_opens_and_closes_again(stub):
+    breaker = AsyncFetcher.CircuitBreaker(failure_threshold=2, reset_timeout=0.3, max_timeout=1)
+    OpenMeteoStub.FAULTS['error_rate'] = 1
+
+    for _ in range(2):
+        with pytest.raises(AsyncFetcher.FetchError, match='500'):
+            AsyncFetcher.fetch_json(forecast_url(stub), hedge_after=5, breaker=breaker)
+    assert breaker.state()['state'] == 'open'
+
+    # refused without a request
+    with pytest.raises(AsyncFetcher.FetchError, match='circuit open'):
+        AsyncFetcher.fetch_json(forecast_url(stub), hedge_after=5, breaker=breaker)
+    assert OpenMeteoStub.REQUESTS == 2
+
+    time.sleep(0.35)
+    assert breaker.state()['state'] == 'half_open'
+
+    OpenMeteoStub.FAULTS['error_rate'] = 0
+    AsyncFetcher.fetch_json(forecast_url(stub), hedge_after=5, breaker=breaker)
+    assert breaker.state() == {'state': 'closed', 'failures': 0, 'retry_in': 0, 'last_error': None}
+
+
+def test_failed_probe_doubles_timeout(stub):
+    breaker = AsyncFetcher.CircuitBreaker(failure_threshold=1, reset_timeout=0.2, max_timeout=1)
+    OpenMeteoStub.FAULTS['error_rate'] = 1
+
+    with pytest.raises(AsyncFetcher.FetchError):
+        AsyncFetcher.fetch_json(forecast_url(stub), hedge_after=5, breaker=breaker)
+    time.sleep(0.25)
+    with pytest.raises(AsyncFetcher.FetchError, match='500'):
+        AsyncFetcher.fetch_json(forecast_url(stub), hedge_after=5, breaker=breaker)
+
+    assert breaker.state()['state'] == 'open'
+    assert breaker.timeout == 0.4
@@ -0,0 +1,52 @@
+import multiprocessing
+import threading
+
+import AsyncFetcher
+import ForecastCache
+import OpenMeteoStub
+
+PROCESSES = 8
+
+
+def fetch_once(db_path, url, start, results):
+    cache = ForecastCache.ForecastCache(db_path, ttl=600)
+    start.wait()
+    payload = cache.get('cell', lambda: AsyncFetcher.fetch_json(url, read_timeout=5, hedge_after=5))
+    results.put(len(payload['daily']['time']))
+
+
+def test_single_flight_across_processes(stub, tmp_path):
+    OpenMeteoStub.FAULTS['delay'] = 0.5
+    db_path = str(tmp_path / 'forecast.sqlite')
+    url = f'{stub}/v1/forecast?latitude=48&longitude=13'
+
+    context = multiprocessing.get_context('fork')
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=fetch_once, args=(db_path, url, start, results)) for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    start.set()
+
+    lengths = [results.get(timeout=30) for _ in processes]
+    for process in processes:
+        process.join(timeout=10)
+
+    assert len(set(lengths)) == 1
+    assert OpenMeteoStub.REQUESTS == 1
+
+
+def test_single_flight_across_threads(stub, tmp_path):
+    OpenMeteoStub.FAULTS['delay'] = 0.3
+    cache = ForecastCache.ForecastCache(str(tmp_path / 'forecast.sqlite'), ttl=600)
+    url = f'{stub}/v1/forecast?latitude=48&longitude=13'
+
+    threads = [threading.Thread(target=cache.get, args=('cell', lambda: AsyncFetcher.fetch_json(url, hedge_after=5)))
+               for _ in range(PROCESSES)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert OpenMeteoStub.REQUESTS == 1
+
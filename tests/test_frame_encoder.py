@@ -0,0 +1,62 @@
+import io
+import os
+
+from PIL import Image, ImageDraw, ImageFont
+
+import FrameEncoder
+
+FONT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fonts', 'Jost.ttf')
+
+
+def flat_frame():
+    image = Image.new('RGB', (400, 240), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 160, 400, 240), fill=(240, 200, 0))
+    draw.rectangle((0, 200, 400, 240), fill=(0, 0, 200))
+    return image
+
+
+def anti_aliased_frame():
+    image = flat_frame()
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.truetype(FONT, 48)
+    draw.text((20, 20), '17:25 12°C', font=font, fill=(0, 0, 0))
+    draw.text((20, 90), 'Monday', font=font, fill=(240, 120, 0))
+    draw.ellipse((300, 20, 380, 100), fill=(30, 30, 40))
+    return image
+
+
+def test_few_colors_are_lossless_png():
+    data, info = FrameEncoder.encode(flat_frame(), 60000, formats=('PNG', 'JPEG'))
+
+    assert info['format'] == 'PNG'
+    assert info['colors'] == 3
+    assert info['error'] == 0
+    assert Image.open(io.BytesIO(data)).convert('RGB').tobytes() == flat_frame().tobytes()
+
+
+def test_anti_aliased_frame_is_quantized_to_png():
+    image = anti_aliased_frame()
+    assert image.getcolors(256) is None
+
+    data, info = FrameEncoder.encode(image, 60000, formats=('PNG', 'JPEG'))
+
+    assert info['format'] == 'PNG'
+    assert info['colors'] in FrameEncoder.PALETTE_SIZES
+    assert info['error'] <= 1.0
+    assert data.startswith(b'\x89PNG')
+
+
+def test_palette_error_above_the_limit_falls_back_to_jpeg():
+    data, info = FrameEncoder.encode(anti_aliased_frame(), 60000, formats=('PNG', 'JPEG'), max_error=0)
+
+    assert info['format'] == 'JPEG'
+    assert [candidate['colors'] for candidate in info['candidates'] if candidate['format'] == 'PNG'] == \
+        list(FrameEncoder.PALETTE_SIZES)
+
+
+def test_jpeg_only_never_tries_png():
+    _, info = FrameEncoder.encode(flat_frame(), 60000)
+
+    assert info['format'] == 'JPEG'
+    assert all(candidate['format'] == 'JPEG' for candidate in info['candidates'])
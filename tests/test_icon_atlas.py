@@ -0,0 +1,40 @@
+import os
+
+import pytest
+from PIL import Image
+
+import IconAtlas
+
+
+@pytest.fixture
+def icon_path(tmp_path):
+    path = tmp_path / 'icons'
+    path.mkdir()
+    for name, color in (('c01d', 'yellow'), ('c01n', 'navy'), ('aqi', 'green')):
+        Image.new('RGBA', (512, 512), color).save(path / f'{name}.png')
+    return str(path)
+
+
+def test_edited_icon_makes_the_atlas_stale(icon_path, tmp_path):
+    atlas_path = str(tmp_path / 'atlas')
+    IconAtlas.build_atlas(icon_path, atlas_path, 64)
+    assert not IconAtlas.is_stale(icon_path, atlas_path, 64)
+
+    # an icon edited in place does not change the mtime of the folder
+    index_mtime = os.path.getmtime(os.path.join(atlas_path, IconAtlas.ATLAS_INDEX))
+    folder_mtime = os.path.getmtime(icon_path)
+    Image.new('RGBA', (512, 512), 'red').save(os.path.join(icon_path, 'aqi.png'))
+    os.utime(os.path.join(icon_path, 'aqi.png'), (index_mtime + 1, index_mtime + 1))
+    os.utime(icon_path, (folder_mtime, folder_mtime))
+
+    assert IconAtlas.is_stale(icon_path, atlas_path, 64)
+    assert IconAtlas.load_atlas(icon_path, atlas_path, 64)['aqi'].getpixel((0, 0)) == (255, 0, 0, 255)
+
+
+def test_larger_cells_rebuild_the_atlas(icon_path, tmp_path):
+    atlas_path = str(tmp_path / 'atlas')
+
+    assert IconAtlas.load_atlas(icon_path, atlas_path, 64)['c01d'].size == (64, 64)
+    assert not IconAtlas.is_stale(icon_path, atlas_path, 32)
+    assert IconAtlas.is_stale(icon_path, atlas_path, 300)
+    assert IconAtlas.load_atlas(icon_path, atlas_path, 300)['c01d'].size == (300, 300)
@@ -0,0 +1,57 @@
+import os
+
+import pygame
+
+import PaletteLayer
+
+FONT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fonts', 'Jost.ttf')
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+
+
+def setup_module():
+    pygame.font.init()
+
+
+def draw_text(surf):
+    surf.fill(WHITE)
+    surf.blit(pygame.font.Font(FONT, 40).render('Hi', True, BLACK), (10, 10))
+
+
+def test_palette_has_theme_colors_and_a_gray_ramp():
+    colors = PaletteLayer.palette([(255, 255, 255), (0, 0, 0), (255, 255, 255), (240, 200, 0)])
+
+    assert len(colors) == 256
+    assert colors[:3] == [(255, 255, 255), (0, 0, 0), (240, 200, 0)]
+    assert colors[-1] == (255, 255, 255)
+    assert all(0 <= value <= 255 for color in colors for value in color)
+
+
+def test_text_background_stays_transparent_on_8_bit_layers():
+    layer = PaletteLayer.create_layer((100, 60), PaletteLayer.palette([WHITE, BLACK]))
+    assert layer.get_bitsize() == 8
+
+    PaletteLayer.draw(layer, draw_text)
+
+    # the top left corner of the text box is transparent in the rendered text
+    assert tuple(layer.get_at((10, 10)))[:3] == WHITE
+    assert BLACK in {tuple(layer.get_at((x, y)))[:3] for x in range(10, 60) for y in range(10, 60)}
+
+
+def test_draw_into_a_region():
+    layer = PaletteLayer.create_layer((100, 100), PaletteLayer.palette([WHITE, BLACK]))
+    layer.fill(BLACK)
+
+    PaletteLayer.draw(layer, draw_text, pygame.Rect(0, 0, 100, 50))
+
+    assert tuple(layer.get_at((10, 10)))[:3] == WHITE
+    assert tuple(layer.get_at((10, 70)))[:3] == BLACK
+
+
+def test_32_bit_layers_are_drawn_directly():
+    layer = PaletteLayer.create_layer((100, 60))
+    assert layer.get_bitsize() == 32
+
+    PaletteLayer.draw(layer, draw_text)
+
+    assert tuple(layer.get_at((10, 10)))[:3] == WHITE
@@ -0,0 +1,23 @@
+import time
+
+from RefreshSchedule import RefreshSchedule
+
+
+def test_next_publish_is_a_whole_second_on_the_local_interval():
+    schedule = RefreshSchedule(interval=120)
+    timestamp = 1_760_000_000.37
+
+    next_publish = schedule.next_publish(timestamp)
+    local = next_publish + time.localtime(next_publish).tm_gmtoff
+
+    assert next_publish == int(next_publish)
+    assert local % 120 == 0
+    assert 0 < next_publish - timestamp <= 120
+
+
+def test_next_publish_does_not_drift():
+    schedule = RefreshSchedule(interval=120)
+    next_publish = schedule.next_publish(1_760_000_000.9)
+
+    assert schedule.next_publish(next_publish - 0.001) == next_publish
+    assert schedule.next_publish(next_publish) == next_publish + 120
@@ -0,0 +1,60 @@
+import WeatherHistory
+
+DAY = 86400
+NOW = 1_760_000_000 // 3600 * 3600
+SITE = '48,13'
+
+
+def weather(temperature):
+    return {'current_temperature': temperature, 'current_pressure': 1000 + temperature, 'daily_dates': ['2025-10-09']}
+
+
+def filled_history(tmp_path, days=10, every=1200, **kwargs):
+    history = WeatherHistory.WeatherHistory(str(tmp_path / 'history.sqlite'), **kwargs)
+    for fetched_at in range(NOW - days * DAY, NOW, every):
+        history.append(SITE, weather(fetched_at % 30), fetched_at)
+    return history
+
+
+def rows(history, start, end=NOW):
+    return list(history.range(SITE, start, end, columns=('current_temperature', 'payload')))
+
+
+def test_retention_and_thinning(tmp_path):
+    history = filled_history(tmp_path, days=10, retention_days=7, compact_after_days=2)
+
+    expired, thinned = history.compact(NOW)
+
+    assert not rows(history, 0, NOW - 7 * DAY - 1)
+    assert expired == 3 * 24 * 3
+    # one row per hour between 7 and 2 days ago, every row of the last 2 days
+    assert len(rows(history, NOW - 7 * DAY, NOW - 2 * DAY - 1)) == 5 * 24
+    assert len(rows(history, NOW - 2 * DAY, NOW)) == 2 * 24 * 3
+    assert thinned == 5 * 24 * 2
+
+
+def test_payloads_are_kept_for_the_forecast_horizon(tmp_path):
+    history = filled_history(tmp_path, days=10, compact_after_days=2, payload_days=8)
+
+    history.compact(NOW)
+
+    assert all(row[2] is None for row in rows(history, 0, NOW - 8 * DAY - 1))
+    recent = rows(history, NOW - 8 * DAY, NOW)
+    assert recent and all(row[2] is not None for row in recent)
+
+
+def test_trend_has_at_most_one_entry_per_bucket(tmp_path):
+    history = filled_history(tmp_path, days=8)
+    history.append(SITE, weather(10), NOW)
+
+    trend = history.pressure_trend(SITE, days=7, buckets=84, now=NOW)
+
+    assert len(trend) == 84
+    assert trend[0][0] == NOW - 7 * DAY
+    assert trend[-1][0] == NOW - 7200
+
+
+def test_trend_of_uneven_buckets(tmp_path):
+    history = filled_history(tmp_path, days=2, every=60)
+
+    assert len(history.trend(SITE, 'current_temperature', days=1, buckets=7, now=NOW)) == 7
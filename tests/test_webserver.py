@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import Webserver
+from SharedFrame import SharedFrame
+
+FRAME = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # the frames are written to and served from the working directory
+    monkeypatch.chdir(tmp_path)
+    return Webserver.app.test_client()
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    shared_frame = SharedFrame(f'weatherpi_test_{os.getpid()}', 4096, create=True)
+    monkeypatch.setattr(Webserver, 'SHARED', {None: shared_frame})
+    yield
+    shared_frame.close()
+
+
+def publish():
+    Webserver.publish_frame(FRAME, {'extension': '.jpg', 'mimetype': 'image/jpeg'})
+    Webserver.publish_bands([(FRAME[:600], {'y': 0, 'height': 10, 'size': 600, 'mimetype': 'image/jpeg'}),
+                             (FRAME[600:], {'y': 10, 'height': 10, 'size': len(FRAME) - 600,
+                                            'mimetype': 'image/jpeg'})])
+
+
+def check_ranges(client, url, body):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.data == body
+
+    response = client.get(url, headers={'Range': 'bytes=0-99'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 0-99/{len(body)}'
+    assert response.data == body[:100]
+
+    response = client.get(url, headers={'Range': 'bytes=-10'})
+    assert response.status_code == 206
+    assert response.data == body[-10:]
+
+    response = client.get(url, headers={'Range': f'bytes={len(body)}-'})
+    assert response.status_code == 416
+
+
+def test_ranges_from_files(client):
+    publish()
+
+    check_ranges(client, '/', FRAME)
+    check_ranges(client, '/band/0', FRAME[:600])
+    check_ranges(client, '/band/1', FRAME[600:])
+
+
+def test_ranges_from_shared_memory(client, shared):
+    publish()
+
+    check_ranges(client, '/', FRAME)
+    check_ranges(client, '/band/1', FRAME[600:])
+
+
+def test_band_of_another_frame(client):
+    publish()
+    frame = client.get('/bands').get_json()['frame']
+
+    assert client.get(f'/band/0?frame={frame}').status_code == 200
+    assert client.get(f'/band/0?frame={frame - 1}').status_code == 409
+    assert client.get('/band/2').status_code == 404